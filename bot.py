@@ -1,79 +1,56 @@
 import os
+import asyncio
+import signal
 import logging
-import json
+from typing import Optional
 import telegram  # Add this to check the version
 print(f"python-telegram-bot version: {telegram.__version__}")  # Debug statement
+from telegram import Bot, Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     Application,
     CommandHandler,
     MessageHandler,
     CallbackQueryHandler,
+    ChatMemberHandler,
     filters,
     CallbackContext,
 )
-from handlers.search import search, handle_link_click, handle_button_click, handle_group_message
-from handlers.linkgen import upload, get_file, batch, genlink, batchgen
+from handlers.search import search, handle_link_click, handle_group_message, handle_db_channel_post, handle_results_page, handle_chat_member_update, cancel_pending_deletions
+from handlers.linkgen import upload, get_file, batch, genlink, batchgen, load_stored_files
 from handlers.redirect import redirect_handler
 from handlers.error import error_handler
-from handlers.admin_activity import stats, logs, broadcast, users
+from handlers.admin_activity import stats, logs, broadcast, users, handle_users_page
 from handlers.admin_management import clone, settings_menu, settings_callback, handle_channel_input  # Add imports for admin_management
-from utils.logging_utils import setup_logging
+from utils.logging_utils import setup_logging, log_queue
+from utils.catalog import catalog, shared_state
+from utils.storage import init_storage, close_storage, get_settings, save_settings, settings_snapshot, add_user, count_users, token_sweeper, result_set_sweeper, journal_compactor, acquire_maintenance_lock, PRIMARY_BOT_ID
+from utils.http_client import close_http_client
+from utils.persistence import flusher
+from utils.broadcast import broadcaster
+from utils.executor import shutdown_executor
+from utils.webhook import run_webhook
+from utils.update_processor import ChatOrderedProcessor
+from utils.tenants import tenants, clone_bot_id
+from utils.sharding import shard
+from utils.supervisor import Supervisor, BOT_WORKERS, worker_heartbeat
 
 logger = logging.getLogger(__name__)
 
-SETTINGS_PATH = "/opt/render/project/src/data/settings.json"
-
-def load_settings():
-    """Load bot settings from settings.json. ⚙️"""
-    try:
-        with open(SETTINGS_PATH, "r") as f:
-            return json.load(f)
-    except Exception as e:
-        logger.error(f"🚨 Failed to load settings: {str(e)}")
-        return {"force_subscription": False, "search_caption": "🔍 Search Result", "delete_timer": "0m", "forcesub_channels": ["@bot_paiyan_official"]}
-
-def save_settings(settings):
-    """Save bot settings to settings.json. 💾"""
-    try:
-        with open(SETTINGS_PATH, "w") as f:
-            json.dump(settings, f, indent=4)
-    except Exception as e:
-        logger.error(f"🚨 Failed to save settings: {str(e)}")
-
-def load_users():
-    """Load user IDs from users.json. 👥"""
-    try:
-        with open("/opt/render/project/src/data/users.json", "r") as f:
-            return json.load(f)
-    except Exception as e:
-        logger.error(f"🚨 Failed to load users: {str(e)}")
-        return []
-
-def save_users(users):
-    """Save user IDs to users.json. 💾"""
-    try:
-        with open("/opt/render/project/src/data/users.json", "w") as f:
-            json.dump(users, f, indent=4)
-    except Exception as e:
-        logger.error(f"🚨 Failed to save users: {str(e)}")
-
 async def start(update: Update, context: CallbackContext):
     """Handle the /start command and set the first user as admin. 🚀"""
     user_id = str(update.effective_user.id)
     username = update.effective_user.username or "Unknown"
-    users = load_users()
-    settings = load_settings()
+    bot_id = context.bot_data["bot_id"]
 
-    # Set the first user as admin 🔑
-    if not settings.get("admin_id") and not users:
+    # Set the first user of the main bot as admin 🔑
+    if bot_id == PRIMARY_BOT_ID and not settings_snapshot().get("admin_id") and not count_users():
+        settings = get_settings()
         settings["admin_id"] = user_id
         save_settings(settings)
         logger.info(f"ℹ️ User {user_id} set as admin")
 
-    # Add user to users.json if not already present 👥
-    if user_id not in users:
-        users.append(user_id)
-        save_users(users)
+    # Register the user with this bot if not already present 👥
+    if add_user(user_id, bot_id):
         logger.info(f"ℹ️ New user added: {user_id}")
 
     # Prepare welcome message with buttons 🎉
@@ -110,7 +87,7 @@ async def button_callback(update: Update, context: CallbackContext):
             parse_mode="Markdown"
         )
     elif query.data == "about_bot":
-        settings = load_settings()
+        settings = settings_snapshot()
         creation_date = settings.get("creation_date", "2025-05-01")
         about_message = (
             "ℹ️ **About TamilSender Bot** ℹ️\n\n"
@@ -124,16 +101,67 @@ async def button_callback(update: Update, context: CallbackContext):
         )
         await query.message.edit_text(about_message, parse_mode="Markdown")
 
-def main():
-    """Start the bot. 🚀"""
-    setup_logging()
-    TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
-    if not TELEGRAM_BOT_TOKEN:
-        logger.error("🚨 TELEGRAM_BOT_TOKEN not set in environment variables")
-        return
+async def post_init(application: Application):
+    """Start background services once the bot is initialized. 🚀"""
+    log_queue.start(application.bot)
+    flusher.start()
+    journal_compactor.start()
+    # With several webhook workers only one of them runs the shared maintenance jobs
+    maintenance = acquire_maintenance_lock()
+    if maintenance:
+        token_sweeper.start()
+        result_set_sweeper.start()
+    # Cloned bots poll for updates, so each runs in exactly one process: the
+    # only one, or the worker its shard assigns it to
+    if shard.index is not None and (maintenance or shard.sharded):
+        tenants.start(lambda token, owner_id: build_application(token, primary=False, owner_id=owner_id), exclude_token=application.bot.token)
+    # Webhook workers and bot workers each ingest part of the uploads and channel posts
+    shared_state.start()
+    if shard.sharded and shard.index is not None:
+        worker_heartbeat.start(application)
+    broadcaster.attach(PRIMARY_BOT_ID, application.bot, resume=maintenance)
 
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+async def post_stop(application: Application):
+    """Flush pending logs while the bot can still send messages. 📤"""
+    await tenants.stop()
+    await worker_heartbeat.stop()
+    await shared_state.stop()
+    await broadcaster.stop()
+    await cancel_pending_deletions()
+    await log_queue.stop()
+    await flusher.stop()
+    await token_sweeper.stop()
+    await result_set_sweeper.stop()
+    await journal_compactor.stop()
 
+async def post_shutdown(application: Application):
+    """Release shared resources when the bot stops. 🔌"""
+    await close_http_client()
+    shutdown_executor()
+    close_storage()
+
+def build_application(token: str, primary: bool = True, owner_id: Optional[str] = None) -> Application:
+    """
+    Build a bot application with all handlers registered. 🏗️
+    The primary bot owns the process-wide services through its lifecycle
+    hooks; cloned bots built with primary=False share them. Each
+    application records the bot ID its users are stored under and, for a
+    clone, the owner who may manage it.
+    """
+    # Chats are handled concurrently, each chat's updates stay in order; the
+    # processor's queue does the scheduling, so it replaces the update queue
+    processor = ChatOrderedProcessor()
+    builder = Application.builder().token(token).concurrent_updates(processor).update_queue(processor.queue)
+    if primary:
+        builder = builder.post_init(post_init).post_stop(post_stop).post_shutdown(post_shutdown)
+    application = builder.build()
+    application.bot_data["bot_id"] = PRIMARY_BOT_ID if primary else clone_bot_id(token)
+    application.bot_data["owner_id"] = None if primary else owner_id
+    register_handlers(application, sync_catalog=primary)
+    return application
+
+def register_handlers(application: Application, sync_catalog: bool = True):
+    """Register the bot's handlers on an application. 🧩"""
     # Command handlers
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("search", search))
@@ -149,19 +177,106 @@ def main():
     application.add_handler(CommandHandler("clone", clone))  # Add clone handler
     application.add_handler(CommandHandler("settings", settings_menu))  # Add settings handler
 
+    # Database channel sync handler, only the primary bot feeds the shared catalog
+    DB_CHANNEL_ID = os.getenv("DB_CHANNEL_ID")
+    if DB_CHANNEL_ID and sync_catalog:
+        db_channel = filters.Chat(username=DB_CHANNEL_ID) if DB_CHANNEL_ID.startswith("@") else filters.Chat(chat_id=int(DB_CHANNEL_ID))
+        application.add_handler(MessageHandler(filters.UpdateType.CHANNEL_POSTS & db_channel, handle_db_channel_post))
+    elif not DB_CHANNEL_ID:
+        logger.error("🚨 DB_CHANNEL_ID not set in environment variables")
+
     # Message and callback handlers
     application.add_handler(MessageHandler(filters.TEXT & (filters.ChatType.GROUPS | filters.ChatType.SUPERGROUP), handle_group_message))
     application.add_handler(MessageHandler(filters.TEXT & filters.ChatType.PRIVATE, handle_channel_input))  # Add handler for channel input
+    application.add_handler(ChatMemberHandler(handle_chat_member_update, ChatMemberHandler.CHAT_MEMBER))
     application.add_handler(CallbackQueryHandler(handle_link_click, pattern="^download_"))
-    application.add_handler(CallbackQueryHandler(handle_button_click, pattern="^(how_to_download|back_to_download)$"))
-    application.add_handler(CallbackQueryHandler(settings_callback, pattern="^(toggle_force_sub|set_delete_timer|set_timer_|manage_force_sub_channels|add_force_sub_channel|remove_force_sub_channel|set_shortener_|back_to_settings|back_to_main)$"))  # Add settings callback handler
+    application.add_handler(CallbackQueryHandler(handle_results_page, pattern="^page_"))
+    application.add_handler(CallbackQueryHandler(handle_users_page, pattern="^users_(next|prev|export)_"))
+    application.add_handler(CallbackQueryHandler(settings_callback, pattern="^(toggle_force_sub|toggle_result_mode|set_delete_timer|set_timer_|manage_force_sub_channels|add_force_sub_channel|remove_force_sub_channel|set_shortener_|back_to_settings|back_to_main)$"))  # Add settings callback handler
     application.add_handler(CallbackQueryHandler(button_callback))
 
     # Error handler
     application.add_error_handler(error_handler)
 
+async def run_shard(token: str):
+    """
+    Host this worker's shard of cloned bots without the primary bot. 🧩
+    Log channel messages still go out as the primary bot.
+    """
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stopping.set)
+
+    async with Bot(token) as bot:
+        log_queue.start(bot)
+        flusher.start()
+        journal_compactor.start()
+        tenants.start(lambda clone_token, owner_id: build_application(clone_token, primary=False, owner_id=owner_id), exclude_token=token)
+        worker_heartbeat.start()
+        shared_state.start()
+        logger.info(f"✅ Bot worker {shard.index} started")
+        await stopping.wait()
+
+        await tenants.stop()
+        await worker_heartbeat.stop()
+        await shared_state.stop()
+        await broadcaster.stop()
+        await cancel_pending_deletions()
+        await log_queue.stop()
+        await flusher.stop()
+        await journal_compactor.stop()
+    await close_http_client()
+    shutdown_executor()
+    close_storage()
+
+def run_worker(index: int, count: int):
+    """Entry point of a supervised worker process. 🛠️"""
+    shard.configure(index, count)
+    setup_logging()
+    TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+    init_storage()
+    catalog.load()
+    load_stored_files()
+    if index == 0:
+        run_primary(TELEGRAM_BOT_TOKEN)
+    else:
+        asyncio.run(run_shard(TELEGRAM_BOT_TOKEN))
+
+def run_primary(token: str):
+    """Run the primary bot, and the clones of this process's shard, with long polling. 📡"""
+    application = build_application(token)
     logger.info("✅ Bot started successfully")
-    application.run_polling()
+    # chat_member updates are opt-in; they keep the force subscription cache fresh
+    application.run_polling(allowed_updates=Update.ALL_TYPES)
+
+def main():
+    """Start the bot. 🚀"""
+    setup_logging()
+    TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+    if not TELEGRAM_BOT_TOKEN:
+        logger.error("🚨 TELEGRAM_BOT_TOKEN not set in environment variables")
+        return
+
+    # Open storage (migrating legacy JSON files once) and load the in-memory indexes
+    init_storage()
+
+    # BOT_WORKERS > 1 spreads the hosted bots over supervised worker processes;
+    # in webhook mode the gunicorn workers (WEB_WORKERS) share them instead
+    if BOT_WORKERS > 1 and os.getenv("BOT_MODE", "polling").lower() != "webhook":
+        Supervisor(BOT_WORKERS, run_worker).run()
+        return
+
+    # New DB channel posts are synced into the local catalog as they arrive
+    catalog.load()
+    load_stored_files()
+
+    # BOT_MODE=webhook serves updates over HTTP; long polling is the default
+    if os.getenv("BOT_MODE", "polling").lower() == "webhook":
+        run_webhook(TELEGRAM_BOT_TOKEN, lambda: build_application(TELEGRAM_BOT_TOKEN))
+        return
+
+    run_primary(TELEGRAM_BOT_TOKEN)
 
 if __name__ == "__main__":
     main()
@@ -1,217 +1,213 @@
 import os
-import logging
+import csv
 import json
+import logging
+import tempfile
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CallbackContext
+from utils.logging_utils import send_log_to_channel, log_user_activity
+from utils.counters import counters
+from utils.storage import settings_snapshot, get_users_page, iter_users
+from utils.broadcast import broadcaster
+from utils.executor import run_blocking
+from utils.update_processor import ChatOrderedProcessor
+from utils.sharding import shard
+from utils.supervisor import format_worker_health
 from datetime import datetime
+from utils.catalog import catalog
 
 logger = logging.getLogger(__name__)
 
-FILES_STORAGE_PATH = "/opt/render/project/src/data/files.json"
-SETTINGS_PATH = "/opt/render/project/src/data/settings.json"
-
-def send_log_to_channel(context: CallbackContext, message: str):
-    """Send a log message to the Telegram log channel. 📜"""
-    LOG_CHANNEL_ID = os.getenv("LOG_CHANNEL_ID")
-    if not LOG_CHANNEL_ID:
-        logger.error("🚨 LOG_CHANNEL_ID not set in environment variables")
-        return
-
-    try:
-        context.bot.send_message(chat_id=LOG_CHANNEL_ID, text=f"📝 {message}")
-        logger.info(f"✅ Log sent to channel {LOG_CHANNEL_ID}: {message}")
-    except Exception as e:
-        logger.error(f"🚨 Failed to send log to channel {LOG_CHANNEL_ID}: {str(e)}")
-
-def log_user_activity(context: CallbackContext, user_id: str, username: str, action: str):
-    """Log user activity in a table format to the log channel. 📊"""
-    cloned_bots = []
-    try:
-        with open("/opt/render/project/src/data/cloned_bots.json", "r") as f:
-            cloned_bots = json.load(f)
-    except:
-        cloned_bots = []
-    user_bots = [bot for bot in cloned_bots if bot["owner_id"] == user_id]
-    num_bots = len(user_bots)
-    files = []
-    try:
-        with open(FILES_STORAGE_PATH, "r") as f:
-            files = json.load(f)
-    except:
-        files = []
-    total_users = len(get_users())
-    
-    table = (
-        "📊 **User Activity Log** 📊\n\n"
-        "┌───────────────────────────────┐\n"
-        f"│ 🆔 **User ID**: {user_id}\n"
-        f"│ 👤 **Username**: @{username}\n"
-        f"│ 🛠️ **Action**: {action}\n"
-        f"│ 🤖 **Created Bots**: {num_bots}\n"
-        f"│ 📁 **Total Files in Bot**: {len(files)}\n"
-        f"│ 👥 **Total Users**: {total_users}\n"
-        "└───────────────────────────────┘"
-    )
-    send_log_to_channel(context, table)
-
-def get_users():
-    """Load user IDs from users.json. 👥"""
-    try:
-        with open("/opt/render/project/src/data/users.json", "r") as f:
-            return json.load(f)
-    except Exception as e:
-        logger.error(f"🚨 Failed to load users: {str(e)}")
-        return []
-
-def get_stored_files():
-    """Load stored files from files.json. 📂"""
-    try:
-        with open(FILES_STORAGE_PATH, "r") as f:
-            return json.load(f)
-    except Exception as e:
-        logger.error(f"🚨 Failed to load stored files: {str(e)}")
-        return []
-
-def get_cloned_bots():
-    """Load cloned bots from cloned_bots.json. 🤖"""
-    try:
-        with open("/opt/render/project/src/data/cloned_bots.json", "r") as f:
-            return json.load(f)
-    except Exception as e:
-        logger.error(f"🚨 Failed to load cloned bots: {str(e)}")
-        return []
-
-def get_settings():
-    """Load bot settings from settings.json. ⚙️"""
-    try:
-        with open(SETTINGS_PATH, "r") as f:
-            return json.load(f)
-    except Exception as e:
-        logger.error(f"🚨 Failed to load settings: {str(e)}")
-        return {"force_subscription": False, "search_caption": "🔍 Search Result", "delete_timer": "0m", "forcesub_channels": ["@bot_paiyan_official"]}
+USERS_PER_PAGE = 50
 
 def is_admin(user_id: str) -> bool:
     """Check if the user is an admin. 🔑"""
-    settings = get_settings()
+    settings = settings_snapshot()
     admin_id = settings.get("admin_id")
     return str(user_id) == str(admin_id)
 
-def stats(update: Update, context: CallbackContext):
+def can_manage_bot(user_id: str, context: CallbackContext) -> bool:
+    """Check if the user may see and message this bot's users: the admin, or the clone's owner. 🔑"""
+    owner_id = context.bot_data.get("owner_id")
+    return is_admin(user_id) or (owner_id is not None and str(user_id) == str(owner_id))
+
+async def stats(update: Update, context: CallbackContext):
     """Show bot statistics to the admin. 📈"""
     user_id = str(update.effective_user.id)
     username = update.effective_user.username or "Unknown"
 
-    if not is_admin(user_id):
-        update.message.reply_text("🚫 You are not authorized to use this command. 😓")
+    if not can_manage_bot(user_id, context):
+        await update.message.reply_text("🚫 You are not authorized to use this command. 😓")
         send_log_to_channel(context, f"User {user_id} tried to access /stats but is not an admin. 🚫")
         log_user_activity(context, user_id, username, "Tried to Access /stats (Unauthorized)")
         return
 
-    users = get_users()
-    files = get_stored_files()
-    cloned_bots = get_cloned_bots()
-
     stats_message = (
         "📊 **Bot Statistics** 📊\n\n"
-        f"👥 **Total Users**: {len(users)}\n"
-        f"📁 **Total Files**: {len(files)}\n"
-        f"🤖 **Total Cloned Bots**: {len(cloned_bots)}\n"
-        f"🕒 **Last Updated**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+        f"👥 **Total Users**: {counters.users_for(context.bot_data['bot_id'])}\n"
+        f"📁 **Total Files**: {counters.total_files}\n"
     )
-    update.message.reply_text(stats_message, parse_mode="Markdown")
+    if is_admin(user_id):
+        # Figures across every hosted bot are for the admin only, not clone owners
+        stats_message += (
+            f"👥 **Users on All Bots**: {counters.total_users}\n"
+            f"🤖 **Total Cloned Bots**: {counters.total_bots}\n"
+        )
+    stats_message += f"🗂️ **Search Cache**: {catalog.search_cache.stats()}\n"
+    processor = context.application.update_processor
+    if isinstance(processor, ChatOrderedProcessor):
+        stats_message += f"🚦 **Updates**: {processor.stats()}\n"
+    if shard.sharded and is_admin(user_id):
+        workers = await run_blocking(format_worker_health, shard.count)
+        stats_message += f"🧑‍✈️ **Workers** (this is #{shard.index}):\n" + "".join(f"• {line}\n" for line in workers)
+    stats_message += f"🕒 **Last Updated**: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+    await update.message.reply_text(stats_message, parse_mode="Markdown")
     send_log_to_channel(context, f"Admin {user_id} viewed bot statistics. 📈")
     log_user_activity(context, user_id, username, "Viewed Bot Statistics")
 
-def logs(update: Update, context: CallbackContext):
+async def logs(update: Update, context: CallbackContext):
     """Show recent logs to the admin. 📜"""
     user_id = str(update.effective_user.id)
     username = update.effective_user.username or "Unknown"
 
     if not is_admin(user_id):
-        update.message.reply_text("🚫 You are not authorized to use this command. 😓")
+        await update.message.reply_text("🚫 You are not authorized to use this command. 😓")
         send_log_to_channel(context, f"User {user_id} tried to access /logs but is not an admin. 🚫")
         log_user_activity(context, user_id, username, "Tried to Access /logs (Unauthorized)")
         return
 
     LOG_CHANNEL_ID = os.getenv("LOG_CHANNEL_ID")
     if not LOG_CHANNEL_ID:
-        update.message.reply_text("🚫 Log channel ID not set. 😓")
+        await update.message.reply_text("🚫 Log channel ID not set. 😓")
         return
 
     try:
-        messages = context.bot.get_chat_history(chat_id=LOG_CHANNEL_ID, limit=5)
+        messages = await context.bot.get_chat_history(chat_id=LOG_CHANNEL_ID, limit=5)
         if not messages:
-            update.message.reply_text("📜 No recent logs found. 😢")
+            await update.message.reply_text("📜 No recent logs found. 😢")
             return
 
         log_message = "📜 **Recent Logs** 📜\n\n"
         for msg in messages:
             log_message += f"🕒 {msg.date.strftime('%Y-%m-%d %H:%M:%S')}\n{msg.text}\n\n"
-        update.message.reply_text(log_message, parse_mode="Markdown")
+        await update.message.reply_text(log_message, parse_mode="Markdown")
         send_log_to_channel(context, f"Admin {user_id} viewed recent logs. 📜")
         log_user_activity(context, user_id, username, "Viewed Recent Logs")
     except Exception as e:
-        update.message.reply_text(f"🚫 Failed to fetch logs: {str(e)} 😓")
+        await update.message.reply_text(f"🚫 Failed to fetch logs: {str(e)} 😓")
         send_log_to_channel(context, f"Admin {user_id} failed to fetch logs: {str(e)} 🚫")
         log_user_activity(context, user_id, username, f"Failed to Fetch Logs: {str(e)}")
 
-def broadcast(update: Update, context: CallbackContext):
-    """Broadcast a message to all users. 📢"""
+async def broadcast(update: Update, context: CallbackContext):
+    """Broadcast a message to all users of this bot in the background. 📢"""
     user_id = str(update.effective_user.id)
     username = update.effective_user.username or "Unknown"
 
-    if not is_admin(user_id):
-        update.message.reply_text("🚫 You are not authorized to use this command. 😓")
+    if not can_manage_bot(user_id, context):
+        await update.message.reply_text("🚫 You are not authorized to use this command. 😓")
         send_log_to_channel(context, f"User {user_id} tried to access /broadcast but is not an admin. 🚫")
         log_user_activity(context, user_id, username, "Tried to Access /broadcast (Unauthorized)")
         return
 
     args = context.args
     if not args:
-        update.message.reply_text("🚫 Please provide a message to broadcast.\nExample: /broadcast Hello everyone! 😄")
+        await update.message.reply_text("🚫 Please provide a message to broadcast.\nExample: /broadcast Hello everyone! 😄")
         return
 
     message = " ".join(args)
-    users = get_users()
-    success_count = 0
-    fail_count = 0
-
-    for user in users:
-        try:
-            context.bot.send_message(chat_id=user, text=f"📢 **Broadcast Message** 📢\n\n{message}", parse_mode="Markdown")
-            success_count += 1
-        except Exception as e:
-            fail_count += 1
-            send_log_to_channel(context, f"Failed to broadcast to user {user}: {str(e)} 🚫")
-
-    update.message.reply_text(
-        f"📢 **Broadcast Report** 📢\n\n"
-        f"✅ Sent to {success_count} users\n"
-        f"🚫 Failed for {fail_count} users",
-        parse_mode="Markdown"
-    )
-    send_log_to_channel(context, f"Admin {user_id} broadcasted message: {message} 📢")
+    # Progress is reported by editing a message in this chat as the broadcast runs
+    broadcast_id = await broadcaster.submit(context.bot_data["bot_id"], update.effective_chat.id, message)
+    send_log_to_channel(context, f"Admin {user_id} started broadcast {broadcast_id}: {message} 📢")
     log_user_activity(context, user_id, username, f"Broadcasted Message: {message}")
 
-def users(update: Update, context: CallbackContext):
-    """List all users of the bot. 👥"""
+def render_users_page(bot_id: int, after: int = 0, before=None):
+    """Build one page of a bot's user list and its navigation keyboard. 👥"""
+    rows = get_users_page(bot_id, after, USERS_PER_PAGE, before=before)
+    if not rows:
+        return None, None
+
+    first, last = rows[0][0], rows[-1][0]
+    user_list = f"👥 **User List** ({counters.users_for(bot_id)} users) 👥\n\n"
+    for rowid, user in rows:
+        user_list += f"{rowid}. User ID: {user}\n"
+
+    navigation = []
+    if get_users_page(bot_id, before=first, limit=1):
+        navigation.append(InlineKeyboardButton("⬅️ Previous", callback_data=f"users_prev_{first}"))
+    if get_users_page(bot_id, last, 1):
+        navigation.append(InlineKeyboardButton("Next ➡️", callback_data=f"users_next_{last}"))
+    keyboard = [navigation] if navigation else []
+    keyboard.append([
+        InlineKeyboardButton("📤 Export CSV", callback_data="users_export_csv"),
+        InlineKeyboardButton("📤 Export JSONL", callback_data="users_export_jsonl")
+    ])
+    return user_list, InlineKeyboardMarkup(keyboard)
+
+def write_users_export(f, bot_id: int, export_format: str):
+    """Stream every user of a bot into an open text file as CSV or JSON lines. 📤"""
+    if export_format == "csv":
+        writer = csv.writer(f)
+        writer.writerow(["position", "user_id"])
+        for rowid, user in iter_users(bot_id):
+            writer.writerow([rowid, user])
+    else:
+        for rowid, user in iter_users(bot_id):
+            f.write(json.dumps({"position": rowid, "user_id": user}) + "\n")
+
+async def users(update: Update, context: CallbackContext):
+    """List the users of the bot one page at a time. 👥"""
     user_id = str(update.effective_user.id)
     username = update.effective_user.username or "Unknown"
 
-    if not is_admin(user_id):
-        update.message.reply_text("🚫 You are not authorized to use this command. 😓")
+    if not can_manage_bot(user_id, context):
+        await update.message.reply_text("🚫 You are not authorized to use this command. 😓")
         send_log_to_channel(context, f"User {user_id} tried to access /users but is not an admin. 🚫")
         log_user_activity(context, user_id, username, "Tried to Access /users (Unauthorized)")
         return
 
-    users = get_users()
-    if not users:
-        update.message.reply_text("🚫 No users found. 😢")
+    user_list, reply_markup = render_users_page(context.bot_data["bot_id"])
+    if not user_list:
+        await update.message.reply_text("🚫 No users found. 😢")
         return
 
-    user_list = "👥 **User List** 👥\n\n"
-    for idx, user in enumerate(users, 1):
-        user_list += f"{idx}. User ID: {user}\n"
-    update.message.reply_text(user_list, parse_mode="Markdown")
+    await update.message.reply_text(user_list, reply_markup=reply_markup, parse_mode="Markdown")
     send_log_to_channel(context, f"Admin {user_id} viewed user list. 👥")
     log_user_activity(context, user_id, username, "Viewed User List")
+
+async def handle_users_page(update: Update, context: CallbackContext):
+    """Page through the user list or export it as a document. 📄"""
+    query = update.callback_query
+    user_id = str(query.from_user.id)
+    username = query.from_user.username or "Unknown"
+
+    if not can_manage_bot(user_id, context):
+        await query.answer("🚫 You are not authorized to do this. 😓", show_alert=True)
+        return
+
+    bot_id = context.bot_data["bot_id"]
+    parts = query.data.split("_")
+    if parts[1] == "export":
+        export_format = parts[2]
+        await query.answer("📤 Preparing export...")
+        # Users are written to a temporary file page by page, never held in memory at once
+        with tempfile.TemporaryFile("w+", newline="", encoding="utf-8") as f:
+            await run_blocking(write_users_export, f, bot_id, export_format)
+            f.seek(0)
+            await context.bot.send_document(
+                chat_id=query.message.chat_id,
+                document=f.buffer,
+                filename=f"users.{export_format}",
+                caption=f"👥 {counters.users_for(bot_id)} users"
+            )
+        send_log_to_channel(context, f"Admin {user_id} exported the user list as {export_format.upper()} 📤")
+        log_user_activity(context, user_id, username, f"Exported User List ({export_format.upper()})")
+        return
+
+    cursor = int(parts[2])
+    if parts[1] == "next":
+        user_list, reply_markup = render_users_page(bot_id, after=cursor)
+    else:
+        user_list, reply_markup = render_users_page(bot_id, before=cursor)
+    await query.answer()
+    if user_list:
+        await query.message.edit_text(user_list, reply_markup=reply_markup, parse_mode="Markdown")
@@ -1,142 +1,59 @@
-import os
 import logging
-import json
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import CallbackContext
+from utils.logging_utils import send_log_to_channel, log_user_activity
+from utils.storage import get_settings, save_settings, settings_snapshot, add_cloned_bot
+from utils.tenants import tenants, is_bot_token
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
-FILES_STORAGE_PATH = "/opt/render/project/src/data/files.json"
-SETTINGS_PATH = "/opt/render/project/src/data/settings.json"
-CLONED_BOTS_PATH = "/opt/render/project/src/data/cloned_bots.json"
-
-def send_log_to_channel(context: CallbackContext, message: str):
-    """Send a log message to the Telegram log channel. 📜"""
-    LOG_CHANNEL_ID = os.getenv("LOG_CHANNEL_ID")
-    if not LOG_CHANNEL_ID:
-        logger.error("🚨 LOG_CHANNEL_ID not set in environment variables")
-        return
-
-    try:
-        context.bot.send_message(chat_id=LOG_CHANNEL_ID, text=f"📝 {message}")
-        logger.info(f"✅ Log sent to channel {LOG_CHANNEL_ID}: {message}")
-    except Exception as e:
-        logger.error(f"🚨 Failed to send log to channel {LOG_CHANNEL_ID}: {str(e)}")
-
-def log_user_activity(context: CallbackContext, user_id: str, username: str, action: str):
-    """Log user activity in a table format to the log channel. 📊"""
-    cloned_bots = []
-    try:
-        with open(CLONED_BOTS_PATH, "r") as f:
-            cloned_bots = json.load(f)
-    except:
-        cloned_bots = []
-    user_bots = [bot for bot in cloned_bots if bot["owner_id"] == user_id]
-    num_bots = len(user_bots)
-    files = []
-    try:
-        with open(FILES_STORAGE_PATH, "r") as f:
-            files = json.load(f)
-    except:
-        files = []
-    total_users = len(get_users())
-    
-    table = (
-        "📊 **User Activity Log** 📊\n\n"
-        "┌───────────────────────────────┐\n"
-        f"│ 🆔 **User ID**: {user_id}\n"
-        f"│ 👤 **Username**: @{username}\n"
-        f"│ 🛠️ **Action**: {action}\n"
-        f"│ 🤖 **Created Bots**: {num_bots}\n"
-        f"│ 📁 **Total Files in Bot**: {len(files)}\n"
-        f"│ 👥 **Total Users**: {total_users}\n"
-        "└───────────────────────────────┘"
-    )
-    send_log_to_channel(context, table)
-
-def get_users():
-    """Load user IDs from users.json. 👥"""
-    try:
-        with open("/opt/render/project/src/data/users.json", "r") as f:
-            return json.load(f)
-    except Exception as e:
-        logger.error(f"🚨 Failed to load users: {str(e)}")
-        return []
-
-def get_settings():
-    """Load bot settings from settings.json. ⚙️"""
-    try:
-        with open(SETTINGS_PATH, "r") as f:
-            return json.load(f)
-    except Exception as e:
-        logger.error(f"🚨 Failed to load settings: {str(e)}")
-        return {"force_subscription": False, "search_caption": "🔍 Search Result", "delete_timer": "0m", "forcesub_channels": ["@bot_paiyan_official"]}
-
-def save_settings(settings):
-    """Save bot settings to settings.json. 💾"""
-    try:
-        with open(SETTINGS_PATH, "w") as f:
-            json.dump(settings, f, indent=4)
-    except Exception as e:
-        logger.error(f"🚨 Failed to save settings: {str(e)}")
-
-def get_cloned_bots():
-    """Load cloned bots from cloned_bots.json. 🤖"""
-    try:
-        with open(CLONED_BOTS_PATH, "r") as f:
-            return json.load(f)
-    except Exception as e:
-        logger.error(f"🚨 Failed to load cloned bots: {str(e)}")
-        return []
-
-def save_cloned_bots(bots):
-    """Save cloned bots to cloned_bots.json. 💾"""
-    try:
-        with open(CLONED_BOTS_PATH, "w") as f:
-            json.dump(bots, f, indent=4)
-    except Exception as e:
-        logger.error(f"🚨 Failed to save cloned bots: {str(e)}")
-
 def is_admin(user_id: str) -> bool:
     """Check if the user is an admin. 🔑"""
-    settings = get_settings()
+    settings = settings_snapshot()
     admin_id = settings.get("admin_id")
     return str(user_id) == str(admin_id)
 
-def clone(update: Update, context: CallbackContext):
+async def clone(update: Update, context: CallbackContext):
     """Clone the bot for a user. 🤖"""
     user_id = str(update.effective_user.id)
     username = update.effective_user.username or "Unknown"
 
     if not is_admin(user_id):
-        update.message.reply_text("🚫 You are not authorized to use this command. 😓")
+        await update.message.reply_text("🚫 You are not authorized to use this command. 😓")
         send_log_to_channel(context, f"User {user_id} tried to access /clone but is not an admin. 🚫")
         log_user_activity(context, user_id, username, "Tried to Access /clone (Unauthorized)")
         return
 
     args = context.args
     if len(args) != 2:
-        update.message.reply_text("🚫 Please provide a bot token and owner ID.\nExample: /clone <BOT_TOKEN> <OWNER_ID> 😅")
+        await update.message.reply_text("🚫 Please provide a bot token and owner ID.\nExample: /clone <BOT_TOKEN> <OWNER_ID> 😅")
         return
 
     bot_token = args[0]
     owner_id = args[1]
+    if not is_bot_token(bot_token):
+        await update.message.reply_text("🚫 That does not look like a bot token. It should look like 123456:ABC-DEF... 😅")
+        return
     logger.info(f"ℹ️ Admin {user_id} cloning bot with token: {bot_token} for owner: {owner_id}")
     send_log_to_channel(context, f"Admin {user_id} initiated bot cloning for owner {owner_id} 🤖")
     log_user_activity(context, user_id, username, f"Initiated Bot Cloning for Owner {owner_id}")
 
-    # Simulate bot cloning (in a real scenario, this would deploy a new bot instance)
-    cloned_bots = get_cloned_bots()
+    # Start the clone in this process right away; it is picked up again on every restart
+    if tenants.active and not await tenants.add(bot_token, owner_id):
+        await update.message.reply_text("🚫 Failed to start the cloned bot. Please check the bot token. 😓")
+        send_log_to_channel(context, f"Admin {user_id} failed to clone bot for owner {owner_id} 🚫")
+        log_user_activity(context, user_id, username, f"Failed to Clone Bot for Owner {owner_id}")
+        return
+
     cloned_bot = {
         "token": bot_token,
         "owner_id": owner_id,
         "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     }
-    cloned_bots.append(cloned_bot)
-    save_cloned_bots(cloned_bots)
+    add_cloned_bot(cloned_bot)
 
-    update.message.reply_text(
+    await update.message.reply_text(
         f"✅ Bot cloned successfully! 🎉\n\n"
         f"🤖 **Bot Token**: {bot_token}\n"
         f"👤 **Owner ID**: {owner_id}",
@@ -145,39 +62,41 @@ def clone(update: Update, context: CallbackContext):
     send_log_to_channel(context, f"Admin {user_id} cloned bot for owner {owner_id} 🤖")
     log_user_activity(context, user_id, username, f"Cloned Bot for Owner {owner_id}")
 
-def settings_menu(update: Update, context: CallbackContext):
+async def settings_menu(update: Update, context: CallbackContext):
     """Display the settings menu for the admin. ⚙️"""
     user_id = str(update.effective_user.id)
     username = update.effective_user.username or "Unknown"
 
     if not is_admin(user_id):
-        update.message.reply_text("🚫 You are not authorized to use this command. 😓")
+        await update.message.reply_text("🚫 You are not authorized to use this command. 😓")
         send_log_to_channel(context, f"User {user_id} tried to access /settings but is not an admin. 🚫")
         log_user_activity(context, user_id, username, "Tried to Access /settings (Unauthorized)")
         return
 
-    settings = get_settings()
+    settings = settings_snapshot()
     keyboard = [
         [InlineKeyboardButton("🔒 Toggle Force Subscription", callback_data="toggle_force_sub")],
         [InlineKeyboardButton("⏳ Set Delete Timer", callback_data="set_delete_timer")],
         [InlineKeyboardButton("🔗 Manage Force Sub Channels", callback_data="manage_force_sub_channels")],
         [InlineKeyboardButton("🔧 Set Shortener", callback_data="set_shortener")],
+        [InlineKeyboardButton("🗂️ Toggle Result Mode", callback_data="toggle_result_mode")],
         [InlineKeyboardButton("🔙 Back to Main Menu", callback_data="back_to_main")]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
-    update.message.reply_text(
+    await update.message.reply_text(
         f"⚙️ **Settings Menu** ⚙️\n\n"
         f"🔒 **Force Subscription**: {'Enabled' if settings.get('force_subscription', False) else 'Disabled'}\n"
         f"⏳ **Delete Timer**: {settings.get('delete_timer', '0m')}\n"
         f"🔗 **Force Sub Channels**: {', '.join(settings.get('forcesub_channels', ['@bot_paiyan_official']))}\n"
-        f"🔧 **Shortener**: {settings.get('shortener', 'GPLinks')}",
+        f"🔧 **Shortener**: {settings.get('shortener', 'GPLinks')}\n"
+        f"🗂️ **Result Mode**: {settings.get('result_mode', 'compact').title()}",
         reply_markup=reply_markup,
         parse_mode="Markdown"
     )
     send_log_to_channel(context, f"Admin {user_id} accessed settings menu ⚙️")
     log_user_activity(context, user_id, username, "Accessed Settings Menu")
 
-def settings_callback(update: Update, context: CallbackContext):
+async def settings_callback(update: Update, context: CallbackContext):
     """Handle settings menu callbacks. 🔄"""
     query = update.callback_query
     user_id = str(query.from_user.id)
@@ -185,7 +104,7 @@ def settings_callback(update: Update, context: CallbackContext):
     data = query.data
 
     if not is_admin(user_id):
-        query.message.edit_text("🚫 You are not authorized to perform this action. 😓")
+        await query.message.edit_text("🚫 You are not authorized to perform this action. 😓")
         send_log_to_channel(context, f"User {user_id} tried to modify settings but is not an admin. 🚫")
         log_user_activity(context, user_id, username, "Tried to Modify Settings (Unauthorized)")
         return
@@ -195,18 +114,35 @@ def settings_callback(update: Update, context: CallbackContext):
     if data == "toggle_force_sub":
         settings["force_subscription"] = not settings.get("force_subscription", False)
         save_settings(settings)
-        query.message.edit_text(
+        await query.message.edit_text(
             f"✅ Force Subscription {'Enabled' if settings['force_subscription'] else 'Disabled'}! 🎉\n\n"
             f"🔒 **Force Subscription**: {'Enabled' if settings['force_subscription'] else 'Disabled'}\n"
             f"⏳ **Delete Timer**: {settings.get('delete_timer', '0m')}\n"
             f"🔗 **Force Sub Channels**: {', '.join(settings.get('forcesub_channels', ['@bot_paiyan_official']))}\n"
-            f"🔧 **Shortener**: {settings.get('shortener', 'GPLinks')}",
+            f"🔧 **Shortener**: {settings.get('shortener', 'GPLinks')}\n"
+            f"🗂️ **Result Mode**: {settings.get('result_mode', 'compact').title()}",
             reply_markup=query.message.reply_markup,
             parse_mode="Markdown"
         )
         send_log_to_channel(context, f"Admin {user_id} toggled force subscription to {settings['force_subscription']} 🔒")
         log_user_activity(context, user_id, username, f"Toggled Force Subscription to {settings['force_subscription']}")
 
+    elif data == "toggle_result_mode":
+        settings["result_mode"] = "classic" if settings.get("result_mode", "compact") == "compact" else "compact"
+        save_settings(settings)
+        await query.message.edit_text(
+            f"✅ Result Mode set to {settings['result_mode'].title()}! 🎉\n\n"
+            f"🔒 **Force Subscription**: {'Enabled' if settings.get('force_subscription', False) else 'Disabled'}\n"
+            f"⏳ **Delete Timer**: {settings.get('delete_timer', '0m')}\n"
+            f"🔗 **Force Sub Channels**: {', '.join(settings.get('forcesub_channels', ['@bot_paiyan_official']))}\n"
+            f"🔧 **Shortener**: {settings.get('shortener', 'GPLinks')}\n"
+            f"🗂️ **Result Mode**: {settings['result_mode'].title()}",
+            reply_markup=query.message.reply_markup,
+            parse_mode="Markdown"
+        )
+        send_log_to_channel(context, f"Admin {user_id} set search result mode to {settings['result_mode']} 🗂️")
+        log_user_activity(context, user_id, username, f"Set Search Result Mode to {settings['result_mode']}")
+
     elif data == "set_delete_timer":
         keyboard = [
             [InlineKeyboardButton("0m ⏳", callback_data="set_timer_0m")],
@@ -216,7 +152,7 @@ def settings_callback(update: Update, context: CallbackContext):
             [InlineKeyboardButton("🔙 Back to Settings", callback_data="back_to_settings")]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
-        query.message.edit_text(
+        await query.message.edit_text(
             "⏳ **Set Delete Timer** ⏳\n\n"
             "Choose a timer for auto-deleting messages:",
             reply_markup=reply_markup,
@@ -234,15 +170,17 @@ def settings_callback(update: Update, context: CallbackContext):
             [InlineKeyboardButton("⏳ Set Delete Timer", callback_data="set_delete_timer")],
             [InlineKeyboardButton("🔗 Manage Force Sub Channels", callback_data="manage_force_sub_channels")],
             [InlineKeyboardButton("🔧 Set Shortener", callback_data="set_shortener")],
+            [InlineKeyboardButton("🗂️ Toggle Result Mode", callback_data="toggle_result_mode")],
             [InlineKeyboardButton("🔙 Back to Main Menu", callback_data="back_to_main")]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
-        query.message.edit_text(
+        await query.message.edit_text(
             f"✅ Delete Timer set to {timer}! 🎉\n\n"
             f"🔒 **Force Subscription**: {'Enabled' if settings.get('force_subscription', False) else 'Disabled'}\n"
             f"⏳ **Delete Timer**: {timer}\n"
             f"🔗 **Force Sub Channels**: {', '.join(settings.get('forcesub_channels', ['@bot_paiyan_official']))}\n"
-            f"🔧 **Shortener**: {settings.get('shortener', 'GPLinks')}",
+            f"🔧 **Shortener**: {settings.get('shortener', 'GPLinks')}\n"
+            f"🗂️ **Result Mode**: {settings.get('result_mode', 'compact').title()}",
             reply_markup=reply_markup,
             parse_mode="Markdown"
         )
@@ -256,7 +194,7 @@ def settings_callback(update: Update, context: CallbackContext):
             [InlineKeyboardButton("🔙 Back to Settings", callback_data="back_to_settings")]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
-        query.message.edit_text(
+        await query.message.edit_text(
             "🔗 **Manage Force Subscription Channels** 🔗\n\n"
             f"Current Channels: {', '.join(settings.get('forcesub_channels', ['@bot_paiyan_official']))}",
             reply_markup=reply_markup,
@@ -267,7 +205,7 @@ def settings_callback(update: Update, context: CallbackContext):
 
     elif data == "add_force_sub_channel":
         context.user_data["awaiting_channel"] = "add"
-        query.message.edit_text(
+        await query.message.edit_text(
             "➕ **Add Force Subscription Channel** ➕\n\n"
             "Please send the channel username (e.g., @channelname):",
             parse_mode="Markdown"
@@ -277,7 +215,7 @@ def settings_callback(update: Update, context: CallbackContext):
 
     elif data == "remove_force_sub_channel":
         context.user_data["awaiting_channel"] = "remove"
-        query.message.edit_text(
+        await query.message.edit_text(
             "➖ **Remove Force Subscription Channel** ➖\n\n"
             "Please send the channel username to remove (e.g., @channelname):",
             parse_mode="Markdown"
@@ -292,7 +230,7 @@ def settings_callback(update: Update, context: CallbackContext):
             [InlineKeyboardButton("🔙 Back to Settings", callback_data="back_to_settings")]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
-        query.message.edit_text(
+        await query.message.edit_text(
             "🔧 **Set URL Shortener** 🔧\n\n"
             "Choose a shortener for download links:",
             reply_markup=reply_markup,
@@ -310,15 +248,17 @@ def settings_callback(update: Update, context: CallbackContext):
             [InlineKeyboardButton("⏳ Set Delete Timer", callback_data="set_delete_timer")],
             [InlineKeyboardButton("🔗 Manage Force Sub Channels", callback_data="manage_force_sub_channels")],
             [InlineKeyboardButton("🔧 Set Shortener", callback_data="set_shortener")],
+            [InlineKeyboardButton("🗂️ Toggle Result Mode", callback_data="toggle_result_mode")],
             [InlineKeyboardButton("🔙 Back to Main Menu", callback_data="back_to_main")]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
-        query.message.edit_text(
+        await query.message.edit_text(
             f"✅ Shortener set to {shortener}! 🎉\n\n"
             f"🔒 **Force Subscription**: {'Enabled' if settings.get('force_subscription', False) else 'Disabled'}\n"
             f"⏳ **Delete Timer**: {settings.get('delete_timer', '0m')}\n"
             f"🔗 **Force Sub Channels**: {', '.join(settings.get('forcesub_channels', ['@bot_paiyan_official']))}\n"
-            f"🔧 **Shortener**: {shortener}",
+            f"🔧 **Shortener**: {shortener}\n"
+            f"🗂️ **Result Mode**: {settings.get('result_mode', 'compact').title()}",
             reply_markup=reply_markup,
             parse_mode="Markdown"
         )
@@ -331,15 +271,17 @@ def settings_callback(update: Update, context: CallbackContext):
             [InlineKeyboardButton("⏳ Set Delete Timer", callback_data="set_delete_timer")],
             [InlineKeyboardButton("🔗 Manage Force Sub Channels", callback_data="manage_force_sub_channels")],
             [InlineKeyboardButton("🔧 Set Shortener", callback_data="set_shortener")],
+            [InlineKeyboardButton("🗂️ Toggle Result Mode", callback_data="toggle_result_mode")],
             [InlineKeyboardButton("🔙 Back to Main Menu", callback_data="back_to_main")]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
-        query.message.edit_text(
+        await query.message.edit_text(
             f"⚙️ **Settings Menu** ⚙️\n\n"
             f"🔒 **Force Subscription**: {'Enabled' if settings.get('force_subscription', False) else 'Disabled'}\n"
             f"⏳ **Delete Timer**: {settings.get('delete_timer', '0m')}\n"
             f"🔗 **Force Sub Channels**: {', '.join(settings.get('forcesub_channels', ['@bot_paiyan_official']))}\n"
-            f"🔧 **Shortener**: {settings.get('shortener', 'GPLinks')}",
+            f"🔧 **Shortener**: {settings.get('shortener', 'GPLinks')}\n"
+            f"🗂️ **Result Mode**: {settings.get('result_mode', 'compact').title()}",
             reply_markup=reply_markup,
             parse_mode="Markdown"
         )
@@ -352,7 +294,7 @@ def settings_callback(update: Update, context: CallbackContext):
             [InlineKeyboardButton("ℹ️ About Bot", callback_data="about_bot")]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
-        query.message.edit_text(
+        await query.message.edit_text(
             "🎉 **Welcome to TamilSender Bot!** 🎉\n\n"
             "🔍 Use /search to find files\n"
             "📤 Use /upload to upload files\n"
@@ -367,7 +309,7 @@ def settings_callback(update: Update, context: CallbackContext):
         send_log_to_channel(context, f"Admin {user_id} returned to main menu 🏁")
         log_user_activity(context, user_id, username, "Returned to Main Menu")
 
-def handle_channel_input(update: Update, context: CallbackContext):
+async def handle_channel_input(update: Update, context: CallbackContext):
     """Handle input for adding/removing force subscription channels. 🔗"""
     user_id = str(update.effective_user.id)
     username = update.effective_user.username or "Unknown"
@@ -377,7 +319,7 @@ def handle_channel_input(update: Update, context: CallbackContext):
         return
 
     if not is_admin(user_id):
-        update.message.reply_text("🚫 You are not authorized to perform this action. 😓")
+        await update.message.reply_text("🚫 You are not authorized to perform this action. 😓")
         send_log_to_channel(context, f"User {user_id} tried to modify force sub channels but is not an admin. 🚫")
         log_user_activity(context, user_id, username, "Tried to Modify Force Sub Channels (Unauthorized)")
         return
@@ -391,27 +333,27 @@ def handle_channel_input(update: Update, context: CallbackContext):
 
     if action == "add":
         if channel in forcesub_channels:
-            update.message.reply_text(f"🚫 Channel {channel} is already in the list. 😓")
+            await update.message.reply_text(f"🚫 Channel {channel} is already in the list. 😓")
             send_log_to_channel(context, f"Admin {user_id} tried to add duplicate channel {channel} 🚫")
             log_user_activity(context, user_id, username, f"Tried to Add Duplicate Channel {channel}")
         else:
             forcesub_channels.append(channel)
             settings["forcesub_channels"] = forcesub_channels
             save_settings(settings)
-            update.message.reply_text(f"✅ Channel {channel} added to force subscription! 🎉")
+            await update.message.reply_text(f"✅ Channel {channel} added to force subscription! 🎉")
             send_log_to_channel(context, f"Admin {user_id} added channel {channel} to force subscription 🔗")
             log_user_activity(context, user_id, username, f"Added Channel {channel} to Force Subscription")
 
     elif action == "remove":
         if channel not in forcesub_channels:
-            update.message.reply_text(f"🚫 Channel {channel} is not in the list. 😓")
+            await update.message.reply_text(f"🚫 Channel {channel} is not in the list. 😓")
             send_log_to_channel(context, f"Admin {user_id} tried to remove non-existent channel {channel} 🚫")
             log_user_activity(context, user_id, username, f"Tried to Remove Non-Existent Channel {channel}")
         else:
             forcesub_channels.remove(channel)
             settings["forcesub_channels"] = forcesub_channels
             save_settings(settings)
-            update.message.reply_text(f"✅ Channel {channel} removed from force subscription! 🎉")
+            await update.message.reply_text(f"✅ Channel {channel} removed from force subscription! 🎉")
             send_log_to_channel(context, f"Admin {user_id} removed channel {channel} from force subscription 🔗")
             log_user_activity(context, user_id, username, f"Removed Channel {channel} from Force Subscription")
 
@@ -422,7 +364,7 @@ def handle_channel_input(update: Update, context: CallbackContext):
         [InlineKeyboardButton("🔙 Back to Settings", callback_data="back_to_settings")]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
-    update.message.reply_text(
+    await update.message.reply_text(
         "🔗 **Manage Force Subscription Channels** 🔗\n\n"
         f"Current Channels: {', '.join(settings.get('forcesub_channels', ['@bot_paiyan_official']))}",
         reply_markup=reply_markup,
@@ -1,104 +1,94 @@
+import io
 import os
+import asyncio
 import logging
-import json
-import requests
+from typing import Iterator, List
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import RetryAfter
 from telegram.ext import CallbackContext
+from utils.logging_utils import send_log_to_channel, log_user_activity
+from utils.catalog import stored_files
+from utils.http_client import get_http_client
+from utils.storage import get_stored_files, get_stored_file, add_file
+from utils.executor import run_blocking
 
 logger = logging.getLogger(__name__)
 
-FILES_STORAGE_PATH = "/opt/render/project/src/data/files.json"
-SETTINGS_PATH = "/opt/render/project/src/data/settings.json"
-
-def send_log_to_channel(context: CallbackContext, message: str):
-    """Send a log message to the Telegram log channel. 📜"""
-    LOG_CHANNEL_ID = os.getenv("LOG_CHANNEL_ID")
-    if not LOG_CHANNEL_ID:
-        logger.error("🚨 LOG_CHANNEL_ID not set in environment variables")
-        return
-
-    try:
-        context.bot.send_message(chat_id=LOG_CHANNEL_ID, text=f"📝 {message}")
-        logger.info(f"✅ Log sent to channel {LOG_CHANNEL_ID}: {message}")
-    except Exception as e:
-        logger.error(f"🚨 Failed to send log to channel {LOG_CHANNEL_ID}: {str(e)}")
-
-def log_user_activity(context: CallbackContext, user_id: str, username: str, action: str):
-    """Log user activity in a table format to the log channel. 📊"""
-    cloned_bots = []
+BATCH_MESSAGE_LIMIT = 3500  # Under the 4096 limit with room for emoji, which count double
+BATCH_DOCUMENT_THRESHOLD = 50  # Files past which results are sent as a document
+BATCH_SEND_INTERVAL = 1.0  # Seconds between messages to the same chat
+GDTOT_API_URL = "https://gdtot.com/api/upload"
+GDTOT_TIMEOUT = 120  # Seconds; remote uploads are slow
+
+def load_stored_files():
+    """Build the shared file ID index from storage. 🔑"""
+    stored_files.rebuild(get_stored_files())
+    logger.info(f"ℹ️ Indexed {len(stored_files)} stored files")
+
+async def find_stored_file(file_id):
+    """
+    Look up a stored file, reading it from storage on a miss. 🔑
+    Another process may have stored it since this one last followed the
+    files table.
+    """
+    file = stored_files.get(file_id)
+    if file is None:
+        file = await run_blocking(get_stored_file, file_id)
+        if file is not None:
+            stored_files.add(file)
+    return file
+
+def chunk_messages(header: str, entries: List[str], limit: int = BATCH_MESSAGE_LIMIT) -> Iterator[str]:
+    """Pack entries into messages under the size limit, header on the first one. ✂️"""
+    current = header
+    for entry in entries:
+        entry = entry[:limit]
+        if current and len(current) + len(entry) > limit:
+            yield current
+            current = ""
+        current += entry
+    if current:
+        yield current
+
+async def send_paced(send, *args, **kwargs):
+    """Send one message, waiting out a flood limit once if Telegram asks. ⏳"""
     try:
-        with open("/opt/render/project/src/data/cloned_bots.json", "r") as f:
-            cloned_bots = json.load(f)
-    except:
-        cloned_bots = []
-    user_bots = [bot for bot in cloned_bots if bot["owner_id"] == user_id]
-    num_bots = len(user_bots)
-    files = []
-    try:
-        with open(FILES_STORAGE_PATH, "r") as f:
-            files = json.load(f)
-    except:
-        files = []
-    total_users = len(get_users())
-    
-    table = (
-        "📊 **User Activity Log** 📊\n\n"
-        "┌───────────────────────────────┐\n"
-        f"│ 🆔 **User ID**: {user_id}\n"
-        f"│ 👤 **Username**: @{username}\n"
-        f"│ 🛠️ **Action**: {action}\n"
-        f"│ 🤖 **Created Bots**: {num_bots}\n"
-        f"│ 📁 **Total Files in Bot**: {len(files)}\n"
-        f"│ 👥 **Total Users**: {total_users}\n"
-        "└───────────────────────────────┘"
-    )
-    send_log_to_channel(context, table)
-
-def get_users():
-    """Load user IDs from users.json. 👥"""
-    try:
-        with open("/opt/render/project/src/data/users.json", "r") as f:
-            return json.load(f)
-    except Exception as e:
-        logger.error(f"🚨 Failed to load users: {str(e)}")
-        return []
-
-def get_stored_files():
-    """Load stored files from files.json. 📂"""
-    try:
-        with open(FILES_STORAGE_PATH, "r") as f:
-            return json.load(f)
-    except Exception as e:
-        logger.error(f"🚨 Failed to load stored files: {str(e)}")
-        return []
-
-def save_files(files):
-    """Save files to files.json. 💾"""
-    try:
-        with open(FILES_STORAGE_PATH, "w") as f:
-            json.dump(files, f, indent=4)
-    except Exception as e:
-        logger.error(f"🚨 Failed to save files: {str(e)}")
+        return await send(*args, **kwargs)
+    except RetryAfter as e:
+        await asyncio.sleep(e.retry_after)
+        return await send(*args, **kwargs)
+
+async def send_batch_results(update: Update, header: str, entries: List[str], document_name: str):
+    """
+    Send /batch and /batchgen results without hitting the message size limit. 📦
+    Small ranges are split into size-bounded messages paced to the per-chat
+    rate limit; large ranges are sent as a single text document.
+    """
+    if len(entries) > BATCH_DOCUMENT_THRESHOLD:
+        text = (header + "".join(entries)).replace("**", "")
+        document = io.BytesIO(text.encode("utf-8"))
+        await send_paced(
+            update.message.reply_document,
+            document=document,
+            filename=document_name,
+            caption=f"{header.strip().replace('**', '')}\n📄 {len(entries)} files"
+        )
+        return
 
-def get_settings():
-    """Load bot settings from settings.json. ⚙️"""
-    try:
-        with open(SETTINGS_PATH, "r") as f:
-            return json.load(f)
-    except Exception as e:
-        logger.error(f"🚨 Failed to load settings: {str(e)}")
-        return {"force_subscription": False, "search_caption": "🔍 Search Result", "delete_timer": "0m", "forcesub_channels": ["@bot_paiyan_official"]}
+    for index, message in enumerate(chunk_messages(header, entries)):
+        if index:
+            await asyncio.sleep(BATCH_SEND_INTERVAL)
+        await send_paced(update.message.reply_text, message, parse_mode="Markdown")
 
-def upload_to_gdtot(file_url):
-    """Upload a file to GDToT and return the download link. 📤"""
+async def upload_to_gdtot(file_url):
+    """Upload a file to GDToT through the shared HTTP client and return the download link. 📤"""
     GDTOT_API_KEY = os.getenv("GDTOT_API_KEY")
     if not GDTOT_API_KEY:
         logger.error("🚨 GDTOT_API_KEY not set in environment variables")
         return None
 
     try:
-        api_url = f"https://gdtot.com/api/upload?api_key={GDTOT_API_KEY}&url={file_url}"
-        response = requests.get(api_url)
+        response = await get_http_client().get(GDTOT_API_URL, params={"api_key": GDTOT_API_KEY, "url": file_url}, timeout=GDTOT_TIMEOUT)
         data = response.json()
         if data.get("status") == "success":
             return data.get("download_link")
@@ -108,14 +98,14 @@ def upload_to_gdtot(file_url):
         logger.error(f"🚨 Error uploading to GDToT: {str(e)}")
         return None
 
-def upload(update: Update, context: CallbackContext):
+async def upload(update: Update, context: CallbackContext):
     """Handle file upload to GDToT and store metadata. 📤"""
     user_id = str(update.effective_user.id)
     username = update.effective_user.username or "Unknown"
     args = context.args
 
     if not args:
-        update.message.reply_text("🚫 Please provide a file URL to upload.\nExample: /upload https://example.com/file.mp4 😅")
+        await update.message.reply_text("🚫 Please provide a file URL to upload.\nExample: /upload https://example.com/file.mp4 😅")
         return
 
     file_url = args[0]
@@ -123,26 +113,26 @@ def upload(update: Update, context: CallbackContext):
     send_log_to_channel(context, f"User {user_id} initiated file upload: {file_url} 📤")
     log_user_activity(context, user_id, username, f"Initiated File Upload: {file_url}")
 
-    gdtot_link = upload_to_gdtot(file_url)
+    gdtot_link = await upload_to_gdtot(file_url)
     if not gdtot_link:
-        update.message.reply_text("🚫 Failed to upload the file to GDToT. 😓")
+        await update.message.reply_text("🚫 Failed to upload the file to GDToT. 😓")
         send_log_to_channel(context, f"User {user_id} failed to upload file: {file_url} 🚫")
         log_user_activity(context, user_id, username, f"Failed File Upload: {file_url}")
         return
 
-    files = get_stored_files()
-    file_id = str(len(files) + 1)
     file_metadata = {
-        "id": file_id,
-        "start_id": file_id,
         "filename": file_url.split("/")[-1],
         "size": "Unknown size",  # GDToT API would need to provide this
         "gdtot_link": gdtot_link
     }
-    files.append(file_metadata)
-    save_files(files)
+    file_id = add_file(file_metadata)
+    if not file_id:
+        await update.message.reply_text("🚫 Failed to save the uploaded file. 😓")
+        send_log_to_channel(context, f"User {user_id} uploaded {file_url} but it could not be saved 🚫")
+        return
+    stored_files.add(file_metadata)
 
-    update.message.reply_text(
+    await update.message.reply_text(
         f"✅ File uploaded successfully! 🎉\n\n"
         f"📁 **File ID**: {file_id}\n"
         f"🔗 **Download Link**: {gdtot_link}",
@@ -151,14 +141,14 @@ def upload(update: Update, context: CallbackContext):
     send_log_to_channel(context, f"User {user_id} uploaded file with ID {file_id} 📤")
     log_user_activity(context, user_id, username, f"Uploaded File with ID: {file_id}")
 
-def get_file(update: Update, context: CallbackContext):
+async def get_file(update: Update, context: CallbackContext):
     """Retrieve a file by ID. 📁"""
     user_id = str(update.effective_user.id)
     username = update.effective_user.username or "Unknown"
     args = context.args
 
     if not args:
-        update.message.reply_text("🚫 Please provide a file ID.\nExample: /get 1 😅")
+        await update.message.reply_text("🚫 Please provide a file ID.\nExample: /get 1 😅")
         return
 
     file_id = args[0]
@@ -166,10 +156,9 @@ def get_file(update: Update, context: CallbackContext):
     send_log_to_channel(context, f"User {user_id} requested file with ID: {file_id} 📁")
     log_user_activity(context, user_id, username, f"Requested File with ID: {file_id}")
 
-    files = get_stored_files()
-    file = next((f for f in files if f["id"] == file_id), None)
+    file = await find_stored_file(file_id)
     if not file:
-        update.message.reply_text(f"🚫 File with ID {file_id} not found. 😓")
+        await update.message.reply_text(f"🚫 File with ID {file_id} not found. 😓")
         send_log_to_channel(context, f"User {user_id} requested non-existent file ID: {file_id} 🚫")
         log_user_activity(context, user_id, username, f"Requested Non-Existent File ID: {file_id}")
         return
@@ -181,59 +170,58 @@ def get_file(update: Update, context: CallbackContext):
         f"📏 **Size**: {file.get('size', 'Unknown size')}\n"
         f"🔗 **Download Link**: {file['gdtot_link']}"
     )
-    update.message.reply_text(response, parse_mode="Markdown")
+    await update.message.reply_text(response, parse_mode="Markdown")
     send_log_to_channel(context, f"User {user_id} retrieved file with ID: {file_id} 📁")
     log_user_activity(context, user_id, username, f"Retrieved File with ID: {file_id}")
 
-def batch(update: Update, context: CallbackContext):
+async def batch(update: Update, context: CallbackContext):
     """Retrieve a range of files by ID. 📦"""
     user_id = str(update.effective_user.id)
     username = update.effective_user.username or "Unknown"
     args = context.args
 
     if len(args) != 2:
-        update.message.reply_text("🚫 Please provide a start and end ID.\nExample: /batch 1 5 😅")
+        await update.message.reply_text("🚫 Please provide a start and end ID.\nExample: /batch 1 5 😅")
         return
 
     try:
         start_id = int(args[0])
         end_id = int(args[1])
     except ValueError:
-        update.message.reply_text("🚫 IDs must be numbers.\nExample: /batch 1 5 😅")
+        await update.message.reply_text("🚫 IDs must be numbers.\nExample: /batch 1 5 😅")
         return
 
     logger.info(f"ℹ️ User {user_id} retrieving batch files from ID {start_id} to {end_id}")
     send_log_to_channel(context, f"User {user_id} requested batch files from ID {start_id} to {end_id} 📦")
     log_user_activity(context, user_id, username, f"Requested Batch Files from ID {start_id} to {end_id}")
 
-    files = get_stored_files()
-    batch_files = [f for f in files if start_id <= int(f["id"]) <= end_id]
+    batch_files = stored_files.range(start_id, end_id)
     if not batch_files:
-        update.message.reply_text(f"🚫 No files found between IDs {start_id} and {end_id}. 😓")
+        await update.message.reply_text(f"🚫 No files found between IDs {start_id} and {end_id}. 😓")
         send_log_to_channel(context, f"User {user_id} found no files between IDs {start_id} and {end_id} 🚫")
         log_user_activity(context, user_id, username, f"Found No Files between IDs {start_id} to {end_id}")
         return
 
-    response = f"📦 **Batch Files (IDs {start_id} to {end_id})** 📦\n\n"
-    for file in batch_files:
-        response += (
-            f"🆔 **ID**: {file['id']}\n"
-            f"📄 **Name**: {file['filename']}\n"
-            f"📏 **Size**: {file.get('size', 'Unknown size')}\n"
-            f"🔗 **Download Link**: {file['gdtot_link']}\n\n"
-        )
-    update.message.reply_text(response, parse_mode="Markdown")
+    header = f"📦 **Batch Files (IDs {start_id} to {end_id})** 📦\n\n"
+    entries = [
+        f"🆔 **ID**: {file['id']}\n"
+        f"📄 **Name**: {file['filename']}\n"
+        f"📏 **Size**: {file.get('size', 'Unknown size')}\n"
+        f"🔗 **Download Link**: {file['gdtot_link']}\n\n"
+        for file in batch_files
+    ]
+    await send_batch_results(update, header, entries, f"batch_{start_id}_{end_id}.txt")
     send_log_to_channel(context, f"User {user_id} retrieved batch files from ID {start_id} to {end_id} 📦")
     log_user_activity(context, user_id, username, f"Retrieved Batch Files from ID {start_id} to {end_id}")
 
-def genlink(update: Update, context: CallbackContext):
+async def genlink(update: Update, context: CallbackContext):
     """Generate a download link for a file by ID. 🔗"""
     user_id = str(update.effective_user.id)
     username = update.effective_user.username or "Unknown"
     args = context.args
 
     if not args:
-        update.message.reply_text("🚫 Please provide a file ID.\nExample: /genlink 1 😅")
+        await update.message.reply_text("🚫 Please provide a file ID.\nExample: /genlink 1 😅")
         return
 
     file_id = args[0]
@@ -241,15 +229,14 @@ def genlink(update: Update, context: CallbackContext):
     send_log_to_channel(context, f"User {user_id} requested link generation for file with ID: {file_id} 🔗")
     log_user_activity(context, user_id, username, f"Requested Link Generation for File ID: {file_id}")
 
-    files = get_stored_files()
-    file = next((f for f in files if f["id"] == file_id), None)
+    file = await find_stored_file(file_id)
     if not file:
-        update.message.reply_text(f"🚫 File with ID {file_id} not found. 😓")
+        await update.message.reply_text(f"🚫 File with ID {file_id} not found. 😓")
         send_log_to_channel(context, f"User {user_id} requested link for non-existent file ID: {file_id} 🚫")
         log_user_activity(context, user_id, username, f"Requested Link for Non-Existent File ID: {file_id}")
         return
 
-    update.message.reply_text(
+    await update.message.reply_text(
         f"🔗 **Generated Link** 🔗\n\n"
         f"📁 **File ID**: {file_id}\n"
         f"🔗 **Download Link**: {file['gdtot_link']}",
@@ -258,42 +245,41 @@ def genlink(update: Update, context: CallbackContext):
     send_log_to_channel(context, f"User {user_id} generated link for file with ID: {file_id} 🔗")
     log_user_activity(context, user_id, username, f"Generated Link for File ID: {file_id}")
 
-def batchgen(update: Update, context: CallbackContext):
+async def batchgen(update: Update, context: CallbackContext):
     """Generate download links for a range of files by ID. 📢"""
     user_id = str(update.effective_user.id)
     username = update.effective_user.username or "Unknown"
     args = context.args
 
     if len(args) != 2:
-        update.message.reply_text("🚫 Please provide a start and end ID.\nExample: /batchgen 1 5 😅")
+        await update.message.reply_text("🚫 Please provide a start and end ID.\nExample: /batchgen 1 5 😅")
         return
 
     try:
         start_id = int(args[0])
         end_id = int(args[1])
     except ValueError:
-        update.message.reply_text("🚫 IDs must be numbers.\nExample: /batchgen 1 5 😅")
+        await update.message.reply_text("🚫 IDs must be numbers.\nExample: /batchgen 1 5 😅")
         return
 
     logger.info(f"ℹ️ User {user_id} generating batch links from ID {start_id} to {end_id}")
     send_log_to_channel(context, f"User {user_id} requested batch link generation from ID {start_id} to {end_id} 📢")
     log_user_activity(context, user_id, username, f"Requested Batch Link Generation from ID {start_id} to {end_id}")
 
-    files = get_stored_files()
-    batch_files = [f for f in files if start_id <= int(f["id"]) <= end_id]
+    batch_files = stored_files.range(start_id, end_id)
     if not batch_files:
-        update.message.reply_text(f"🚫 No files found between IDs {start_id} and {end_id}. 😓")
+        await update.message.reply_text(f"🚫 No files found between IDs {start_id} and {end_id}. 😓")
         send_log_to_channel(context, f"User {user_id} found no files for batch link generation between IDs {start_id} and {end_id} 🚫")
         log_user_activity(context, user_id, username, f"Found No Files for Batch Link Generation between IDs {start_id} to {end_id}")
         return
 
-    response = f"📢 **Batch Generated Links (IDs {start_id} to {end_id})** 📢\n\n"
-    for file in batch_files:
-        response += (
-            f"🆔 **ID**: {file['id']}\n"
-            f"📄 **Name**: {file['filename']}\n"
-            f"🔗 **Download Link**: {file['gdtot_link']}\n\n"
-        )
-    update.message.reply_text(response, parse_mode="Markdown")
+    header = f"📢 **Batch Generated Links (IDs {start_id} to {end_id})** 📢\n\n"
+    entries = [
+        f"🆔 **ID**: {file['id']}\n"
+        f"📄 **Name**: {file['filename']}\n"
+        f"🔗 **Download Link**: {file['gdtot_link']}\n\n"
+        for file in batch_files
+    ]
+    await send_batch_results(update, header, entries, f"batchgen_{start_id}_{end_id}.txt")
     send_log_to_channel(context, f"User {user_id} generated batch links from ID {start_id} to {end_id} 📢")
     log_user_activity(context, user_id, username, f"Generated Batch Links from ID {start_id} to {end_id}")
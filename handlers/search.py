@@ -1,100 +1,47 @@
 import os
+import asyncio
 import logging
-import json
-import requests
 import uuid
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import CallbackContext, JobQueue
-from utils.search_utils import search_files, get_related_keywords
-from datetime import datetime, timedelta
+from telegram.ext import CallbackContext
+from utils.logging_utils import send_log_to_channel, log_user_activity
+from utils.catalog import catalog
+from utils.storage import settings_snapshot, save_result_set, get_result_set, RESULT_SET_TTL
+from utils.cache import TTLCache
+from utils.executor import run_blocking
+from utils.shortener import short_urls
+from utils.membership import check_subscriptions, update_membership
 
 logger = logging.getLogger(__name__)
 
-SETTINGS_PATH = "/opt/render/project/src/data/settings.json"
+RESULTS_PER_PAGE = 5
+MAX_RESULTS = 50
 
-def send_log_to_channel(context: CallbackContext, message: str):
-    """Send a log message to the Telegram log channel. 📜"""
-    LOG_CHANNEL_ID = os.getenv("LOG_CHANNEL_ID")
-    if not LOG_CHANNEL_ID:
-        logger.error("🚨 LOG_CHANNEL_ID not set in environment variables")
-        return
-
-    try:
-        context.bot.send_message(chat_id=LOG_CHANNEL_ID, text=f"📝 {message}")
-        logger.info(f"✅ Log sent to channel {LOG_CHANNEL_ID}: {message}")
-    except Exception as e:
-        logger.error(f"🚨 Failed to send log to channel {LOG_CHANNEL_ID}: {str(e)}")
-
-def log_user_activity(context: CallbackContext, user_id: str, username: str, action: str):
-    """Log user activity in a table format to the log channel. 📊"""
-    cloned_bots = []
-    try:
-        with open("/opt/render/project/src/data/cloned_bots.json", "r") as f:
-            cloned_bots = json.load(f)
-    except:
-        cloned_bots = []
-    user_bots = [bot for bot in cloned_bots if bot["owner_id"] == user_id]
-    num_bots = len(user_bots)
-    total_users = len(get_users())
-    
-    table = (
-        "📊 **User Activity Log** 📊\n\n"
-        "┌───────────────────────────────┐\n"
-        f"│ 🆔 **User ID**: {user_id}\n"
-        f"│ 👤 **Username**: @{username}\n"
-        f"│ 🛠️ **Action**: {action}\n"
-        f"│ 🤖 **Created Bots**: {num_bots}\n"
-        f"│ 👥 **Total Users**: {total_users}\n"
-        "└───────────────────────────────┘"
-    )
-    send_log_to_channel(context, table)
-
-def get_users():
-    """Load user IDs from users.json. 👥"""
-    try:
-        with open("/opt/render/project/src/data/users.json", "r") as f:
-            return json.load(f)
-    except Exception as e:
-        logger.error(f"🚨 Failed to load users: {str(e)}")
-        return []
+# Result sets behind compact search cards, so pages can be edited in place.
+# They are stored in the database for other webhook workers; this is a local front.
+result_sets = TTLCache(maxsize=4096, ttl=RESULT_SET_TTL)
 
-def get_settings():
-    """Load bot settings from settings.json. ⚙️"""
-    try:
-        with open(SETTINGS_PATH, "r") as f:
-            return json.load(f)
-    except Exception as e:
-        logger.error(f"🚨 Failed to load settings: {str(e)}")
-        return {"force_subscription": False, "search_caption": "🔍 Search Result", "delete_timer": "0m", "forcesub_channels": ["@bot_paiyan_official"]}
+# Scheduled deletions, referenced here so their tasks are not garbage collected
+_pending_deletions = set()
 
 def can_shorten_url():
     """Check if URL shortening is enabled and possible. 🔗"""
     GPLINKS_API_KEY = os.getenv("GPLINKS_API_KEY")
-    settings = get_settings()
+    settings = settings_snapshot()
     shortener = settings.get("shortener", "GPLinks")
     return shortener != "None" and GPLINKS_API_KEY is not None
 
-def shorten_url(url):
+async def shorten_url(url):
     """Shorten a URL using GPLinks API if available, else return the raw URL. 🔗"""
     GPLINKS_API_KEY = os.getenv("GPLINKS_API_KEY")
-    settings = get_settings()
+    settings = settings_snapshot()
     shortener = settings.get("shortener", "GPLinks")
 
     if shortener == "None" or not GPLINKS_API_KEY:
         logger.info("ℹ️ GPLinks API key not set or shortener disabled, using raw URL")
         return url
 
-    try:
-        api_url = f"https://gplinks.co/api?api={GPLINKS_API_KEY}&url={url}"
-        response = requests.get(api_url)
-        data = response.json()
-        if data.get("status") == "success":
-            return data.get("shortenedUrl")
-        logger.error(f"🚨 Failed to shorten URL: {data.get('message')}")
-        return url
-    except Exception as e:
-        logger.error(f"🚨 Error shortening URL: {str(e)}")
-        return url
+    return await short_urls.shorten(url, GPLINKS_API_KEY)
 
 def parse_delete_timer(timer_str):
     """Parse delete timer string (e.g., '10m', '10h') into seconds. ⏳"""
@@ -109,14 +56,31 @@ def parse_delete_timer(timer_str):
     except (ValueError, IndexError):
         return 0
 
+async def delete_message_later(bot, chat_id, message_id, delay_seconds):
+    """Delete a message once its delete timer runs out. 🗑️"""
+    await asyncio.sleep(delay_seconds)
+    try:
+        await bot.delete_message(chat_id=chat_id, message_id=message_id)
+    except Exception as e:
+        logger.error(f"🚨 Failed to delete message {message_id} in {chat_id}: {str(e)}")
+
 def schedule_message_deletion(context: CallbackContext, chat_id, message_id, delay_seconds):
-    """Schedule a message for deletion after a delay. 🗑️"""
+    """
+    Schedule a message for deletion after a delay. 🗑️
+    The deletion waits in a plain asyncio task, since the job queue needs
+    APScheduler, which is not installed.
+    """
     if delay_seconds > 0:
-        context.job_queue.run_once(
-            lambda ctx: ctx.bot.delete_message(chat_id=chat_id, message_id=message_id),
-            delay_seconds,
-            context=(chat_id, message_id)
-        )
+        task = asyncio.create_task(delete_message_later(context.bot, chat_id, message_id, delay_seconds))
+        _pending_deletions.add(task)
+        task.add_done_callback(_pending_deletions.discard)
+
+async def cancel_pending_deletions():
+    """Cancel deletions that are still waiting, e.g. on shutdown. 🛑"""
+    tasks = list(_pending_deletions)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
 
 def parse_file_size(size_str):
     """Parse file size string (e.g., '2.5 MB') and convert to GB. 📏"""
@@ -133,52 +97,74 @@ def parse_file_size(size_str):
     except (ValueError, IndexError):
         return 0
 
-def fetch_files_from_channel(context: CallbackContext):
+async def handle_db_channel_post(update: Update, context: CallbackContext):
     """
-    Fetch files from the database channel by reading recent messages. 📂
-    Assumes each message in the channel has the format:
-    Filename: <name>
-    Size: <size>
-    Link: <gdtot_link>
+    Sync new and edited database channel posts into the local catalog. 📂
+    Search and download clicks read from this catalog, never from the channel.
     """
-    DB_CHANNEL_ID = os.getenv("DB_CHANNEL_ID")
-    if not DB_CHANNEL_ID:
-        logger.error("🚨 DB_CHANNEL_ID not set in environment variables")
-        return []
+    message = update.channel_post or update.edited_channel_post
+    if not message:
+        return
+    await catalog.ingest_message(message, edited=update.edited_channel_post is not None)
 
+async def remember_results(result_id: str, result_set: dict):
+    """Keep a result set locally and in the database. 💾"""
+    result_sets.set(result_id, result_set)
     try:
-        # Fetch recent messages from the channel (limit to 100 for now)
-        messages = context.bot.get_chat_history(chat_id=DB_CHANNEL_ID, limit=100)
-        files = []
-        for idx, msg in enumerate(messages, 1):
-            if not msg.text:
-                continue
-
-            # Parse the message text to extract file metadata
-            lines = msg.text.split("\n")
-            file_data = {}
-            for line in lines:
-                if line.startswith("Filename:"):
-                    file_data["filename"] = line.replace("Filename:", "").strip()
-                elif line.startswith("Size:"):
-                    file_data["size"] = line.replace("Size:", "").strip()
-                elif line.startswith("Link:"):
-                    file_data["gdtot_link"] = line.replace("Link:", "").strip()
-
-            # Ensure all required fields are present
-            if all(key in file_data for key in ["filename", "size", "gdtot_link"]):
-                file_data["id"] = str(idx)  # Use message index as a unique ID
-                file_data["start_id"] = str(idx)  # Same as ID for consistency
-                file_data["upload_date"] = msg.date.strftime("%Y-%m-%d")  # Add upload date
-                files.append(file_data)
-
-        logger.info(f"ℹ️ Fetched {len(files)} files from database channel {DB_CHANNEL_ID}")
-        return files
+        await run_blocking(save_result_set, result_id, result_set)
     except Exception as e:
-        logger.error(f"🚨 Failed to fetch files from channel {DB_CHANNEL_ID}: {str(e)}")
-        return []
-
-def search(update: Update, context: CallbackContext):
+        logger.error(f"🚨 Failed to save result set {result_id}: {str(e)}")
+
+async def load_results(result_id: str):
+    """Return a result set, reading it from the database if another worker created it. 🔍"""
+    result_set = result_sets.get(result_id)
+    if result_set is None:
+        result_set = await run_blocking(get_result_set, result_id)
+        if result_set is not None:
+            result_sets.set(result_id, result_set)
+    return result_set
+
+async def render_results_page(result_id: str, page: int):
+    """
+    Render one page of a stored result set as a single card. 🗂️
+    Returns the card text and its keyboard, or None if the result set expired.
+    """
+    result_set = await load_results(result_id)
+    if not result_set:
+        return None
+
+    if any(catalog.get(start_id) is None for start_id in result_set["start_ids"]):
+        # Created by a worker that ingested posts this one has not followed yet
+        await catalog.refresh()
+    files = [file for file in (catalog.get(start_id) for start_id in result_set["start_ids"]) if file]
+    pages = max(1, (len(files) + RESULTS_PER_PAGE - 1) // RESULTS_PER_PAGE)
+    page = min(max(page, 0), pages - 1)
+    first = page * RESULTS_PER_PAGE
+
+    text = f"{result_set['caption']}\n\n🔍 **{result_set['query']}** ({len(files)} results)\n\n"
+    keyboard = []
+    for idx, file in enumerate(files[first:first + RESULTS_PER_PAGE], first + 1):
+        text += (
+            f"{idx}. **{file.get('filename')}** ({file.get('size', 'Unknown size')})\n"
+            f"📅 **Uploaded**: {file.get('upload_date', 'Unknown')}\n\n"
+        )
+        keyboard.append([InlineKeyboardButton(
+            f"📥 {idx}. {file.get('filename')[:40]}",
+            callback_data=f"download_{result_id}_{page}_{file.get('start_id')}"
+        )])
+
+    navigation = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton("⬅️ Prev", callback_data=f"page_{result_id}_{page - 1}"))
+    if pages > 1:
+        navigation.append(InlineKeyboardButton(f"📄 {page + 1}/{pages}", callback_data=f"page_{result_id}_{page}"))
+    if page < pages - 1:
+        navigation.append(InlineKeyboardButton("Next ➡️", callback_data=f"page_{result_id}_{page + 1}"))
+    if navigation:
+        keyboard.append(navigation)
+    return text, InlineKeyboardMarkup(keyboard)
+
+async def search(update: Update, context: CallbackContext):
     """
     Handle search command or group message to search for files in the database channel. 🔍
     """
@@ -187,27 +173,24 @@ def search(update: Update, context: CallbackContext):
     query = None
 
     # Check subscription to all force subscription channels 🔒
-    settings = get_settings()
+    settings = settings_snapshot()
     forcesub_channels = settings.get("forcesub_channels", ["@bot_paiyan_official"])
     if settings.get("force_subscription", False):
-        keyboard = []
-        for channel in forcesub_channels:
-            try:
-                chat_id = channel if channel.startswith("@") else f"@{channel}"
-                member = context.bot.get_chat_member(chat_id=chat_id, user_id=user_id)
-                if member.status in ["left", "kicked"]:
-                    keyboard.append([InlineKeyboardButton(f"🔗 Join {chat_id} 🌟", url=f"https://t.me/{chat_id[1:]}")])
-            except Exception as e:
-                message = update.message.reply_text(f"🚫 Error checking membership for {chat_id}. Please try again. 😓")
-                delete_timer = parse_delete_timer(settings.get("delete_timer", "0m"))
-                schedule_message_deletion(context, update.message.chat_id, message.message_id, delete_timer)
-                send_log_to_channel(context, f"Error checking membership for user {user_id} in {chat_id}: {str(e)} 🚫")
-                log_user_activity(context, user_id, username, f"Failed Membership Check for {chat_id}")
-                return
+        missing, error = await check_subscriptions(context.bot, user_id, forcesub_channels)
+        if error:
+            chat_id, e = error
+            message = await update.message.reply_text(f"🚫 Error checking membership for {chat_id}. Please try again. 😓")
+            delete_timer = parse_delete_timer(settings.get("delete_timer", "0m"))
+            schedule_message_deletion(context, update.message.chat_id, message.message_id, delete_timer)
+            send_log_to_channel(context, f"Error checking membership for user {user_id} in {chat_id}: {str(e)} 🚫")
+            log_user_activity(context, user_id, username, f"Failed Membership Check for {chat_id}")
+            return
+
+        keyboard = [[InlineKeyboardButton(f"🔗 Join {chat_id} 🌟", url=f"https://t.me/{chat_id[1:]}")] for chat_id in missing]
 
         if keyboard:
             reply_markup = InlineKeyboardMarkup(keyboard)
-            message = update.message.reply_text("🚫 You must join the following channels to use this bot! 🔗", reply_markup=reply_markup)
+            message = await update.message.reply_text("🚫 You must join the following channels to use this bot! 🔗", reply_markup=reply_markup)
             delete_timer = parse_delete_timer(settings.get("delete_timer", "0m"))
             schedule_message_deletion(context, update.message.chat_id, message.message_id, delete_timer)
             send_log_to_channel(context, f"User {user_id} denied access - not subscribed to required channels. 🚫")
@@ -219,7 +202,7 @@ def search(update: Update, context: CallbackContext):
     else:
         args = context.args
         if not args:
-            message = update.message.reply_text("🚫 Please provide a search query.\nExample: /search Avengers 😅")
+            message = await update.message.reply_text("🚫 Please provide a search query.\nExample: /search Avengers 😅")
             delete_timer = parse_delete_timer(settings.get("delete_timer", "0m"))
             schedule_message_deletion(context, update.message.chat_id, message.message_id, delete_timer)
             return
@@ -229,23 +212,41 @@ def search(update: Update, context: CallbackContext):
     send_log_to_channel(context, f"User {user_id} searched for: {query} 🔍")
     log_user_activity(context, user_id, username, f"Searched for: {query}")
 
-    # Fetch files from the database channel
-    files = fetch_files_from_channel(context)
-    if not files:
-        message = update.message.reply_text("🚫 No files found in the database channel. 😢")
+    # Search the local catalog synced from the database channel
+    if not len(catalog):
+        await catalog.refresh_if_stale()
+    if not len(catalog):
+        message = await update.message.reply_text("🚫 No files found in the database channel. 😢")
         delete_timer = parse_delete_timer(settings.get("delete_timer", "0m"))
         schedule_message_deletion(context, update.message.chat_id, message.message_id, delete_timer)
         return
 
-    matching_files = search_files(query, files, limit=5)
+    compact = settings.get("result_mode", "compact") == "compact"
+    matching_files = await catalog.find(query, limit=MAX_RESULTS if compact else 5, fuzzy=True)
     if not matching_files:
-        message = update.message.reply_text(f"🚫 No results found for '{query}'. 😓")
+        message = await update.message.reply_text(f"🚫 No results found for '{query}'. 😓")
         delete_timer = parse_delete_timer(settings.get("delete_timer", "0m"))
         schedule_message_deletion(context, update.message.chat_id, message.message_id, delete_timer)
         return
 
-    settings = get_settings()
     caption = settings.get("search_caption", "🔍 Search Result")
+
+    # Compact mode: one card with a button per result and pages edited in place
+    if compact:
+        result_id = uuid.uuid4().hex[:10]
+        await remember_results(result_id, {
+            "query": query,
+            "caption": caption,
+            "start_ids": [file.get("start_id") for file in matching_files if file.get("gdtot_link")]
+        })
+        text, reply_markup = await render_results_page(result_id, 0)
+        group_message = await update.message.reply_text(text, reply_markup=reply_markup, parse_mode="Markdown")
+        send_log_to_channel(context, f"User {user_id} received {len(matching_files)} search results for: {query} 🔍")
+
+        delete_timer = parse_delete_timer(settings.get("delete_timer", "0m"))
+        schedule_message_deletion(context, update.message.chat_id, group_message.message_id, delete_timer)
+        return
+
     can_shorten = can_shorten_url()  # Check if we can shorten URLs
 
     # Display search results
@@ -257,7 +258,7 @@ def search(update: Update, context: CallbackContext):
         # Shorten the link only if we can (will be displayed if shortened)
         display_url = None
         if can_shorten:
-            display_url = shorten_url(gdtot_link)
+            display_url = await shorten_url(gdtot_link)
 
         # Prepare the search result message
         group_response = (
@@ -270,44 +271,48 @@ def search(update: Update, context: CallbackContext):
 
         keyboard = [[InlineKeyboardButton("📥 Download Now", callback_data=f"download_{file.get('start_id')}")]]
         reply_markup = InlineKeyboardMarkup(keyboard)
-        group_message = update.message.reply_text(group_response, reply_markup=reply_markup, parse_mode="Markdown")
+        group_message = await update.message.reply_text(group_response, reply_markup=reply_markup, parse_mode="Markdown")
         send_log_to_channel(context, f"User {user_id} received search result: {file.get('filename')} 🔍")
 
         delete_timer = parse_delete_timer(settings.get("delete_timer", "0m"))
         schedule_message_deletion(context, update.message.chat_id, group_message.message_id, delete_timer)
 
-def handle_link_click(update: Update, context: CallbackContext):
+async def handle_link_click(update: Update, context: CallbackContext):
     """
     Handle the click on a download button to redirect the user directly to the file. 📥
     """
     query = update.callback_query
+    await query.answer()
     user_id = str(query.from_user.id)
     username = query.from_user.username or "Unknown"
     start_id = query.data.split("_")[-1]
 
-    # Fetch files again to find the matching file
-    files = fetch_files_from_channel(context)
-    file = next((f for f in files if f["start_id"] == start_id), None)
+    # Look the file up in the local catalog's ID index
+    file = await catalog.lookup(start_id)
     if not file:
-        query.message.edit_text("🚫 File not found or link expired. 😓")
+        await query.message.edit_text("🚫 File not found or link expired. 😓")
         send_log_to_channel(context, f"User {user_id} tried to access non-existent file with start_id {start_id} 🚫")
         log_user_activity(context, user_id, username, f"Tried to Access Non-Existent File (start_id: {start_id})")
         return
 
     gdtot_link = file.get("gdtot_link")
     if not gdtot_link:
-        query.message.edit_text("🚫 Download link not available. 😓")
+        await query.message.edit_text("🚫 Download link not available. 😓")
         send_log_to_channel(context, f"User {user_id} tried to access invalid link for start_id {start_id} 🚫")
         log_user_activity(context, user_id, username, f"Tried to Access Invalid Link (start_id: {start_id})")
         return
 
     # Shorten the link if possible (for the redirect)
-    final_url = shorten_url(gdtot_link)
+    final_url = await shorten_url(gdtot_link)
 
     # Redirect the user directly to the download link
     keyboard = [[InlineKeyboardButton("📥 Download File", url=final_url)]]
+    parts = query.data.split("_")
+    if len(parts) == 4:
+        # Clicked from a compact card, offer a way back to the same page
+        keyboard.append([InlineKeyboardButton("🔙 Back to Results", callback_data=f"page_{parts[1]}_{parts[2]}")])
     reply_markup = InlineKeyboardMarkup(keyboard)
-    query.message.edit_text(
+    await query.message.edit_text(
         f"✅ Redirecting to your file: **{file.get('filename')}** 🎉\n"
         f"Click below to start the download! 📩",
         reply_markup=reply_markup,
@@ -316,6 +321,32 @@ def handle_link_click(update: Update, context: CallbackContext):
     send_log_to_channel(context, f"User {user_id} redirected to download file with start_id {start_id} 📥")
     log_user_activity(context, user_id, username, f"Redirected to Download File (start_id: {start_id})")
 
-def handle_group_message(update: Update, context: CallbackContext):
+async def handle_results_page(update: Update, context: CallbackContext):
+    """Switch a compact search card to another page by editing it in place. 📄"""
+    query = update.callback_query
+    _, result_id, page = query.data.split("_")
+
+    rendered = await render_results_page(result_id, int(page))
+    if not rendered:
+        await query.answer("⌛ These results have expired. Please search again.", show_alert=True)
+        return
+
+    await query.answer()
+    text, reply_markup = rendered
+    try:
+        await query.message.edit_text(text, reply_markup=reply_markup, parse_mode="Markdown")
+    except Exception as e:
+        # Telegram rejects edits that leave the message unchanged
+        logger.info(f"ℹ️ Results page not edited: {str(e)}")
+
+async def handle_chat_member_update(update: Update, context: CallbackContext):
+    """Keep cached force subscription checks in line with channel joins and leaves. 🔄"""
+    member_update = update.chat_member
+    if not member_update:
+        return
+    member = member_update.new_chat_member
+    update_membership(member_update.chat, str(member.user.id), member.status)
+
+async def handle_group_message(update: Update, context: CallbackContext):
     """Handle all group messages as search queries. 💬"""
-    search(update, context)
+    await search(update, context)
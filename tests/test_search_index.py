@@ -0,0 +1,77 @@
+import random
+import pytest
+from utils.records import FileRecord
+from utils.search_utils import SearchIndex
+
+WORDS = ["the", "avengers", "endgame", "hd", "720p", "1080p", "tamil", "movie", "ok", "hi",
+         "x264", "2024", "dubbed", "a", "ab", "web-dl", "Leo", "Jailer"]
+QUERIES = ["hi", "ok", "hd", "a", "x", "ab", "zz", "e", "the", "hd movie", "avengers",
+           "Avengers Endgame", "tamil movie 2024", "leo", "web-dl 720p", "nothing here"]
+
+def reference_search(query, files, limit=5):
+    """The original linear search_files scoring the index has to match."""
+    if not query or not files:
+        return []
+    query = query.lower().strip()
+    scored_files = []
+    for file in files:
+        filename = file.get("filename", "").lower()
+        if not filename:
+            continue
+        score = 0
+        if query == filename:
+            score += 100
+        else:
+            common_words = set(query.split()).intersection(set(filename.split()))
+            score += len(common_words) * 20
+            if query in filename:
+                score += 10
+        if score > 0:
+            scored_files.append((file, score))
+    scored_files.sort(key=lambda x: x[1], reverse=True)
+    return [file for file, score in scored_files[:limit]]
+
+def build_catalog(size, seed=1):
+    rng = random.Random(seed)
+    records = {}
+    for file_id in range(1, size + 1):
+        name = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 5)))
+        records[file_id] = FileRecord(file_id, file_id, name, "1 GB", "https://gdtot/x", None)
+    # A few exact single-word and two-letter names
+    for file_id, name in ((size + 1, "hi"), (size + 2, "Ok"), (size + 3, "avengers endgame")):
+        records[file_id] = FileRecord(file_id, file_id, name, "1 GB", "https://gdtot/x", None)
+    index = SearchIndex(records, "id")
+    for record in records.values():
+        index.add(record)
+    return records, index
+
+def ids(records):
+    return [record["id"] for record in records]
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_ranking_matches_reference(query):
+    records, index = build_catalog(2000)
+    files = [record.to_dict() for record in records.values()]
+    expected = ids(reference_search(query, files, 10))
+    assert ids(index.search(query, 10)) == expected
+
+def test_replaced_record_is_searched_by_its_new_name():
+    records, index = build_catalog(200)
+    old = records[5]
+    new = FileRecord(5, 5, "Zq unique title", "1 GB", "https://gdtot/y", None)
+    index.remove(old)
+    records[5] = new
+    index.add(new)
+
+    assert ids(index.search("zq", 5)) == ["5"]
+    assert ids(index.search("unique title", 5)) == ["5"]
+    files = [record.to_dict() for record in records.values()]
+    for query in QUERIES:
+        assert ids(index.search(query, 10)) == ids(reference_search(query, files, 10))
+
+def test_short_query_without_matches_touches_no_documents():
+    records, index = build_catalog(200)
+    assert list(index._substring_candidates("zz")) == []
+    assert set(index._substring_candidates("hi")) == {
+        file_id for file_id, record in records.items() if "hi" in record.filename.lower()
+    }
@@ -0,0 +1,159 @@
+import asyncio
+import random
+from datetime import datetime, timezone
+import pytest
+from telegram import Chat, Message, Update
+from telegram.constants import ChatType
+from utils.update_processor import ChatOrderedProcessor, ChatOrderedQueue
+
+_next_id = [0]
+
+def make_update(chat_id: int, text: str = "/search x", chat_type: str = ChatType.PRIVATE) -> Update:
+    _next_id[0] += 1
+    chat = Chat(chat_id, chat_type)
+    message = Message(_next_id[0], datetime.now(timezone.utc), chat, text=text)
+    return Update(_next_id[0], message=message)
+
+def run(coroutine):
+    return asyncio.run(asyncio.wait_for(coroutine, timeout=5))
+
+async def get_soon(queue: ChatOrderedQueue, timeout: float = 0.05):
+    """Return the next item, or None if the queue hands out nothing in time."""
+    try:
+        return await asyncio.wait_for(queue.get(), timeout)
+    except asyncio.TimeoutError:
+        return None
+
+def test_chat_waits_for_its_running_update():
+    async def scenario():
+        queue = ChatOrderedQueue(concurrency=4)
+        a1, a2, b1 = make_update(1), make_update(1), make_update(2)
+        for update in (a1, a2, b1):
+            queue.put_nowait(update)
+
+        assert await queue.get() is a1
+        # Chat 1 is busy, so chat 2 goes next and nothing else is ready
+        assert await queue.get() is b1
+        assert await get_soon(queue) is None
+
+        queue.release(a1)
+        assert await queue.get() is a2
+    run(scenario())
+
+def test_free_slot_needed_before_handing_out():
+    async def scenario():
+        queue = ChatOrderedQueue(concurrency=1)
+        a1, b1 = make_update(1), make_update(2)
+        queue.put_nowait(a1)
+        queue.put_nowait(b1)
+
+        assert await queue.get() is a1
+        assert await get_soon(queue) is None
+        queue.release(a1)
+        assert await queue.get() is b1
+    run(scenario())
+
+def test_chat_backlog_drops_new_updates():
+    async def scenario():
+        queue = ChatOrderedQueue(max_pending=100, max_chat_backlog=2)
+        for _ in range(3):
+            queue.put_nowait(make_update(1))
+        queue.put_nowait(make_update(2))
+        assert queue.queued == 3
+        assert queue.shed == 1
+    run(scenario())
+
+def test_group_chatter_shed_past_threshold():
+    async def scenario():
+        queue = ChatOrderedQueue(max_pending=8, max_chat_backlog=100)
+        assert queue.shed_threshold == 6
+        for chat_id in range(6):
+            queue.put_nowait(make_update(chat_id, "hello", ChatType.GROUP))
+        assert queue.shed == 0
+
+        queue.put_nowait(make_update(10, "hello", ChatType.SUPERGROUP))
+        assert queue.shed == 1
+        # Commands and private messages are kept past the threshold
+        queue.put_nowait(make_update(11, "/search hello", ChatType.GROUP))
+        queue.put_nowait(make_update(12, "hello", ChatType.PRIVATE))
+        assert queue.shed == 1
+        assert queue.queued == 8
+    run(scenario())
+
+def test_put_waits_while_full():
+    async def scenario():
+        queue = ChatOrderedQueue(concurrency=4, max_pending=2)
+        queue.put_nowait(make_update(1))
+        queue.put_nowait(make_update(2))
+        assert queue.full()
+        with pytest.raises(asyncio.QueueFull):
+            queue.put_nowait(make_update(3))
+
+        waiting = asyncio.ensure_future(queue.put(make_update(3)))
+        await asyncio.sleep(0.01)
+        assert not waiting.done()
+        await queue.get()
+        await asyncio.wait_for(waiting, 1)
+        assert queue.queued == 2
+    run(scenario())
+
+def test_stop_signal_after_backlog_and_join():
+    async def scenario():
+        queue = ChatOrderedQueue(concurrency=4)
+        signal = object()
+        a1, a2 = make_update(1), make_update(1)
+        queue.put_nowait(a1)
+        queue.put_nowait(a2)
+        queue.put_nowait(signal)
+
+        assert await queue.get() is a1
+        # The signal waits behind chat 1's queued update
+        assert await get_soon(queue) is None
+        queue.release(a1)
+        assert await queue.get() is a2
+        assert await queue.get() is signal
+
+        joined = asyncio.ensure_future(queue.join())
+        queue.task_done()
+        queue.task_done()
+        await asyncio.sleep(0.01)
+        assert not joined.done()
+        queue.task_done()
+        await asyncio.wait_for(joined, 1)
+    run(scenario())
+
+def test_processor_keeps_each_chat_in_order():
+    async def scenario():
+        processor = ChatOrderedProcessor(concurrency=4, max_pending=1000)
+        queue = processor.queue
+        handled = {}
+        running = {}
+        overlaps = []
+        expected = {}
+        for seq in range(20):
+            for chat_id in range(5):
+                queue.put_nowait(make_update(chat_id, f"/search {seq}"))
+                expected.setdefault(chat_id, []).append(str(seq))
+
+        async def handle(update: Update):
+            chat_id = update.effective_chat.id
+            running[chat_id] = running.get(chat_id, 0) + 1
+            overlaps.append(running[chat_id])
+            await asyncio.sleep(random.random() / 500)
+            handled.setdefault(chat_id, []).append(update.message.text.split()[1])
+            running[chat_id] -= 1
+
+        # Mirrors the application's fetcher: one task per update, task_done once it ran
+        async def process(update):
+            await processor.process_update(update, handle(update))
+            queue.task_done()
+
+        tasks = [asyncio.ensure_future(process(await queue.get())) for _ in range(100)]
+        await asyncio.gather(*tasks)
+        await queue.join()
+
+        assert handled == expected
+        assert max(overlaps) == 1
+        assert processor.processed == 100
+        assert processor.pending == 0
+    run(scenario())
@@ -0,0 +1,203 @@
+import time
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Optional
+from telegram.error import RetryAfter, Forbidden, BadRequest
+from utils.counters import counters
+from utils.storage import add_broadcast, set_broadcast_message, save_broadcast_progress, get_running_broadcasts, get_users_page
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_RATE = 25  # Messages per second, under Telegram's ~30/s global limit
+BROADCAST_CONCURRENCY = 10  # Sends in flight at once
+BROADCAST_PAGE_SIZE = 200  # Users read and checkpointed per step
+BROADCAST_MAX_RETRIES = 3  # RetryAfter retries per user
+PROGRESS_INTERVAL = 5  # Seconds between progress message edits
+
+class TokenBucket:
+    """
+    Token bucket rate limiter for outgoing messages. 🪣
+    Tokens refill at `rate` per second up to `capacity`; each send takes one.
+    """
+
+    def __init__(self, rate: float = BROADCAST_RATE, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until a token is available and take it. ⏳"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Drain the bucket so no one sends for a while, e.g. after a RetryAfter. 🛑"""
+        self._tokens = -seconds * self.rate
+        self._updated = time.monotonic()
+
+class BroadcastEngine:
+    """
+    Background broadcast sender. 📢
+    Each broadcast goes to the users of one bot and is sent through that
+    bot, since users who only started a clone cannot be messaged by the
+    main bot. Every attached bot has its own token bucket, as Telegram
+    limits each bot separately. Each broadcast runs as its own task,
+    reading users in rowid pages with bounded concurrency. After every page
+    the cursor and counts are saved, so a restart resumes from the last
+    finished page, and the progress message is edited in place every few
+    seconds.
+    """
+
+    def __init__(self, rate: float = BROADCAST_RATE, concurrency: int = BROADCAST_CONCURRENCY):
+        self.rate = rate
+        self.concurrency = concurrency
+        self._bots: Dict[int, object] = {}
+        self._buckets: Dict[int, TokenBucket] = {}
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._task_bots: Dict[int, int] = {}
+
+    def attach(self, bot_id: int, bot, resume: bool = True):
+        """Send a bot's broadcasts through it, resuming its unfinished ones. 🚀"""
+        self._bots[bot_id] = bot
+        self._buckets.setdefault(bot_id, TokenBucket(self.rate))
+        if not resume:
+            return
+        for broadcast in get_running_broadcasts(bot_id):
+            logger.info(f"ℹ️ Resuming broadcast {broadcast['id']} after user {broadcast['cursor']}")
+            self._spawn(broadcast)
+
+    async def detach(self, bot_id: int):
+        """Pause a bot's broadcasts, e.g. when its clone stops; their progress is already saved. ⏸️"""
+        self._bots.pop(bot_id, None)
+        self._buckets.pop(bot_id, None)
+        await self._cancel([task for broadcast_id, task in self._tasks.items() if self._task_bots.get(broadcast_id) == bot_id])
+
+    async def stop(self):
+        """Stop all running broadcasts; their progress is already saved. 🛑"""
+        await self._cancel(list(self._tasks.values()))
+        self._tasks.clear()
+        self._task_bots.clear()
+        self._bots.clear()
+        self._buckets.clear()
+
+    @staticmethod
+    async def _cancel(tasks):
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def submit(self, bot_id: int, chat_id: int, message: str) -> int:
+        """Start broadcasting a message to a bot's users and report progress to chat_id. 📤"""
+        broadcast = {
+            "bot_id": bot_id,
+            "message": message,
+            "chat_id": chat_id,
+            "total": counters.users_for(bot_id),
+            "cursor": 0,
+            "sent": 0,
+            "failed": 0
+        }
+        broadcast["id"] = add_broadcast(bot_id, message, chat_id, broadcast["total"], datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        progress = await self._bots[bot_id].send_message(chat_id=chat_id, text=self._progress_text(broadcast))
+        broadcast["progress_message_id"] = progress.message_id
+        set_broadcast_message(broadcast["id"], progress.message_id)
+        self._spawn(broadcast)
+        return broadcast["id"]
+
+    @property
+    def running(self) -> int:
+        return len(self._tasks)
+
+    def _spawn(self, broadcast: Dict):
+        task = asyncio.create_task(self._run(broadcast))
+        self._tasks[broadcast["id"]] = task
+        self._task_bots[broadcast["id"]] = broadcast["bot_id"]
+        task.add_done_callback(lambda _: self._forget(broadcast["id"]))
+
+    def _forget(self, broadcast_id: int):
+        self._tasks.pop(broadcast_id, None)
+        self._task_bots.pop(broadcast_id, None)
+
+    @staticmethod
+    def _progress_text(broadcast: Dict, done: bool = False) -> str:
+        processed = broadcast["sent"] + broadcast["failed"]
+        title = "📢 Broadcast Report 📢" if done else "📢 Broadcasting... 📢"
+        return (
+            f"{title}\n\n"
+            f"📨 Processed {processed}/{broadcast['total']} users\n"
+            f"✅ Sent to {broadcast['sent']} users\n"
+            f"🚫 Failed for {broadcast['failed']} users"
+        )
+
+    async def _update_progress(self, broadcast: Dict, done: bool = False):
+        if not broadcast.get("progress_message_id"):
+            return
+        try:
+            await self._bots[broadcast["bot_id"]].edit_message_text(
+                chat_id=broadcast["chat_id"],
+                message_id=broadcast["progress_message_id"],
+                text=self._progress_text(broadcast, done)
+            )
+        except Exception as e:
+            logger.error(f"🚨 Failed to update broadcast progress: {str(e)}")
+
+    async def _send(self, bot_id: int, user_id: str, text: str) -> bool:
+        bot, bucket = self._bots[bot_id], self._buckets[bot_id]
+        for attempt in range(BROADCAST_MAX_RETRIES + 1):
+            await bucket.acquire()
+            try:
+                await bot.send_message(chat_id=user_id, text=text, parse_mode="Markdown")
+                return True
+            except RetryAfter as e:
+                # Flood limits apply to the whole bot, so every sender backs off
+                bucket.pause(e.retry_after)
+                await asyncio.sleep(e.retry_after)
+            except (Forbidden, BadRequest):
+                return False
+            except Exception as e:
+                logger.error(f"🚨 Failed to broadcast to user {user_id}: {str(e)}")
+                return False
+        return False
+
+    async def _run(self, broadcast: Dict):
+        text = f"📢 **Broadcast Message** 📢\n\n{broadcast['message']}"
+        semaphore = asyncio.Semaphore(self.concurrency)
+        last_update = time.monotonic()
+
+        async def send(user_id: str) -> bool:
+            async with semaphore:
+                return await self._send(broadcast["bot_id"], user_id, text)
+
+        try:
+            while True:
+                page = get_users_page(broadcast["bot_id"], broadcast["cursor"], BROADCAST_PAGE_SIZE)
+                if not page:
+                    break
+                results = await asyncio.gather(*(send(user_id) for rowid, user_id in page))
+                broadcast["sent"] += sum(results)
+                broadcast["failed"] += len(results) - sum(results)
+                broadcast["cursor"] = page[-1][0]
+                broadcast["total"] = max(broadcast["total"], broadcast["sent"] + broadcast["failed"])
+                save_broadcast_progress(broadcast["id"], broadcast["cursor"], broadcast["sent"], broadcast["failed"])
+                if time.monotonic() - last_update >= PROGRESS_INTERVAL:
+                    last_update = time.monotonic()
+                    await self._update_progress(broadcast)
+        except asyncio.CancelledError:
+            logger.info(f"ℹ️ Broadcast {broadcast['id']} paused after user {broadcast['cursor']}")
+            raise
+
+        save_broadcast_progress(broadcast["id"], broadcast["cursor"], broadcast["sent"], broadcast["failed"], status="done")
+        await self._update_progress(broadcast, done=True)
+        logger.info(f"✅ Broadcast {broadcast['id']} finished: {broadcast['sent']} sent, {broadcast['failed']} failed")
+
+broadcaster = BroadcastEngine()
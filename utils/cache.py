@@ -0,0 +1,57 @@
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+class TTLCache:
+    """
+    Small LRU cache whose entries also expire after a fixed TTL. ⏳
+    Keeps hit/miss counters so the cache can be sized from real traffic.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return a cached value, or default if missing or expired. 🔍"""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Cache a value, evicting the least recently used entry if full. 💾"""
+        self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove and return a cached value. 🗑️"""
+        entry = self._entries.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        """Drop every entry, keeping the counters. 🧹"""
+        self._entries.clear()
+
+    def stats(self) -> str:
+        """Summarize size and hit rate for logs and /stats. 📊"""
+        lookups = self.hits + self.misses
+        hit_rate = (self.hits / lookups * 100) if lookups else 0
+        return f"{len(self)}/{self.maxsize} entries, {self.hits} hits, {self.misses} misses ({hit_rate:.1f}% hit rate)"
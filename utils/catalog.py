@@ -0,0 +1,313 @@
+import time
+import bisect
+import asyncio
+import logging
+from array import array
+from typing import List, Dict, Optional, Tuple, Union
+from utils.search_utils import SearchIndex, normalize
+from utils.cache import TTLCache
+from utils.executor import run_blocking
+from utils.storage import get_catalog_changes, save_catalog_entry, save_catalog_high_water, get_stored_files
+from utils.records import FileRecord, as_record, compact_id
+
+logger = logging.getLogger(__name__)
+
+SEARCH_CACHE_SIZE = 2048
+SEARCH_CACHE_TTL = 600  # Seconds
+SHARED_STATE_INTERVAL = 15  # Seconds between checks for files added by other processes
+MISS_REFRESH_INTERVAL = 2  # Seconds between catalog refreshes triggered by searches that found nothing
+
+def parse_file_message(text: str) -> Optional[Dict]:
+    """
+    Parse a database channel post into file metadata. 📄
+    Expects the format:
+    Filename: <name>
+    Size: <size>
+    Link: <gdtot_link>
+    """
+    if not text:
+        return None
+
+    file_data = {}
+    for line in text.split("\n"):
+        if line.startswith("Filename:"):
+            file_data["filename"] = line.replace("Filename:", "").strip()
+        elif line.startswith("Size:"):
+            file_data["size"] = line.replace("Size:", "").strip()
+        elif line.startswith("Link:"):
+            file_data["gdtot_link"] = line.replace("Link:", "").strip()
+
+    # Ensure all required fields are present
+    if not all(key in file_data for key in ["filename", "size", "gdtot_link"]):
+        return None
+    return file_data
+
+class FileIndex:
+    """
+    ID to record hash index for constant-time file lookups. 🔑
+    Shared by the download-click, /get and /genlink handlers and kept
+    up to date incrementally as files are added.
+    Records are keyed by the int IDs they already hold rather than by new
+    strings, and numeric IDs are also kept in a sorted array, so /batch and
+    /batchgen ranges are found by bisection instead of a scan.
+    """
+
+    def __init__(self, key: str = "id"):
+        self.key = key
+        self.records: Dict[Union[int, str], FileRecord] = {}
+        self._sorted_ids = array("q")
+
+    def __len__(self):
+        return len(self.records)
+
+    def __contains__(self, file_id):
+        return compact_id(file_id) in self.records
+
+    @property
+    def last_id(self) -> int:
+        """Highest numeric ID in the index, 0 when empty. 🔝"""
+        return self._sorted_ids[-1] if self._sorted_ids else 0
+
+    def values(self) -> List[FileRecord]:
+        """Return all records in insertion order. 📋"""
+        return list(self.records.values())
+
+    def get(self, file_id) -> Optional[FileRecord]:
+        """Look up a record by ID. 🔍"""
+        return self.records.get(compact_id(file_id))
+
+    def range(self, start: int, end: int) -> List[FileRecord]:
+        """Return records with numeric IDs from start to end inclusive, in ID order. 📦"""
+        lo = bisect.bisect_left(self._sorted_ids, start)
+        hi = bisect.bisect_right(self._sorted_ids, end)
+        return [self.records[file_id] for file_id in self._sorted_ids[lo:hi]]
+
+    def _index_id(self, file_id):
+        if not isinstance(file_id, int):
+            return
+        # IDs are allocated in increasing order, so this is usually an append
+        if not self._sorted_ids or file_id > self._sorted_ids[-1]:
+            self._sorted_ids.append(file_id)
+        else:
+            position = bisect.bisect_left(self._sorted_ids, file_id)
+            if position == len(self._sorted_ids) or self._sorted_ids[position] != file_id:
+                self._sorted_ids.insert(position, file_id)
+
+    def add(self, record: Dict):
+        """Add or replace a single record, stored as a compact FileRecord. ➕"""
+        record = as_record(record)
+        key = record.key(self.key)
+        if key not in self.records:
+            self._index_id(key)
+        self.records[key] = record
+
+    def rebuild(self, records: List[Dict]):
+        """Replace the whole index, e.g. after loading from disk. 🔄"""
+        records = (as_record(record) for record in records)
+        # Cleared in place, since the search index shares this mapping
+        self.records.clear()
+        self.records.update((record.key(self.key), record) for record in records if self.key in record)
+        self._sorted_ids = array("q", sorted(key for key in self.records if isinstance(key, int)))
+
+class FileCatalog:
+    """
+    Local copy of the database channel file list. 📂
+    New channel posts are ingested as they arrive; the highest message ID
+    seen so far is kept as a high-water mark so nothing is read twice.
+    Each ingested post is written as a single row of the catalog table, so
+    a burst of posts costs one small write per post, never a rewrite of the
+    whole catalog. Every row carries a version, and refresh() reads only
+    rows past the last version seen, so processes sharing the database
+    follow each other's posts and edits incrementally.
+    Search results are cached per normalized query until the catalog changes.
+    """
+
+    def __init__(self):
+        self.last_message_id = 0
+        self.version = 0
+        self.refreshed_at = 0.0
+        self.by_id = FileIndex("start_id")
+        self.index = SearchIndex(self.by_id.records, "start_id")
+        self.search_cache = TTLCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL)
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def files(self) -> List[FileRecord]:
+        """Return all catalog entries in channel order. 📋"""
+        return self.by_id.values()
+
+    def get(self, start_id: str) -> Optional[FileRecord]:
+        """Look up a catalog entry by its start ID. 🔑"""
+        return self.by_id.get(start_id)
+
+    async def lookup(self, start_id: str) -> Optional[FileRecord]:
+        """
+        Look up a catalog entry, refreshing once on a miss. 🔑
+        A button can reach this process before it has followed the post
+        that another process just ingested.
+        """
+        file = self.get(start_id)
+        if file is None:
+            await self.refresh()
+            file = self.get(start_id)
+        return file
+
+    def search(self, query: str, limit: int = 5, fuzzy: bool = False) -> List[FileRecord]:
+        """Search the catalog through the result cache and its inverted index. 🔍"""
+        query = " ".join(normalize(query).split())
+        key = (query, limit, fuzzy)
+        results = self.search_cache.get(key)
+        if results is None:
+            results = self.index.search(query, limit, fuzzy=fuzzy)
+            self.search_cache.set(key, results)
+        return list(results)
+
+    async def find(self, query: str, limit: int = 5, fuzzy: bool = False) -> List[FileRecord]:
+        """
+        Search the catalog, refreshing once when nothing matches. 🔎
+        A search can reach this process before it has followed the post
+        that another process just ingested. Most group chatter matches
+        nothing, so misses refresh at most once per MISS_REFRESH_INTERVAL.
+        """
+        results = self.search(query, limit, fuzzy)
+        if not results and await self.refresh_if_stale():
+            results = self.search(query, limit, fuzzy)
+        return results
+
+    async def refresh_if_stale(self) -> bool:
+        """Refresh unless the catalog was refreshed in the last MISS_REFRESH_INTERVAL seconds. Returns True if it refreshed. ⏱️"""
+        if time.monotonic() - self.refreshed_at < MISS_REFRESH_INTERVAL:
+            return False
+        await self.refresh()
+        return True
+
+    def add(self, file_data: Dict):
+        """Add or replace a catalog entry and index it. ➕"""
+        file_data = as_record(file_data)
+        previous = self.by_id.get(file_data.start_id)
+        if previous is not None:
+            self.index.remove(previous)
+        self.by_id.add(file_data)
+        self.index.add(file_data)
+        self.search_cache.clear()
+
+    async def ingest_message(self, message, edited: bool = False) -> bool:
+        """
+        Add a channel post to the catalog if it is past the high-water mark. 📥
+        Edited posts replace the entry they were originally ingested as.
+        """
+        if message.message_id <= self.last_message_id and not edited:
+            return False
+
+        file_data = parse_file_message(message.text)
+        if not file_data:
+            self.last_message_id = max(self.last_message_id, message.message_id)
+            await run_blocking(save_catalog_high_water, message.message_id)
+            return False
+
+        # Channel message IDs are stable, so they double as file IDs
+        file_data["id"] = str(message.message_id)
+        file_data["start_id"] = str(message.message_id)
+        file_data["upload_date"] = message.date.strftime("%Y-%m-%d")
+        record = as_record(file_data)
+        self.add(record)
+        self.last_message_id = max(self.last_message_id, message.message_id)
+        try:
+            await run_blocking(save_catalog_entry, record, self.last_message_id)
+        except Exception as e:
+            logger.error(f"🚨 Failed to save catalog entry {record.start_id}: {str(e)}")
+        logger.info(f"ℹ️ Catalog synced file {record.start_id}: {record.filename}")
+        return True
+
+    def _apply(self, changes: List[Tuple[int, FileRecord]], high_water: int) -> int:
+        """Merge rows read from the catalog table, returning how many entries changed. 🔀"""
+        changed = 0
+        for version, record in changes:
+            if self.by_id.get(record.start_id) != record:
+                self.add(record)
+                changed += 1
+            self.version = version
+        self.last_message_id = max(self.last_message_id, high_water)
+        return changed
+
+    def load(self):
+        """Load the catalog from storage. 📂"""
+        self.refreshed_at = time.monotonic()
+        while True:
+            changes, high_water = get_catalog_changes(self.version)
+            self._apply(changes, high_water)
+            if not changes:
+                break
+        logger.info(f"ℹ️ Loaded {len(self)} files from the catalog (last message {self.last_message_id})")
+
+    async def refresh(self):
+        """
+        Pick up entries that other processes added or edited since the last load. 🔄
+        Only rows past the last version seen are read, so the cost follows the
+        number of changes, not the size of the catalog.
+        """
+        self.refreshed_at = time.monotonic()
+        changed = 0
+        while True:
+            changes, high_water = await run_blocking(get_catalog_changes, self.version)
+            changed += self._apply(changes, high_water)
+            if not changes:
+                break
+        if changed:
+            logger.info(f"ℹ️ Catalog picked up {changed} new or edited files")
+
+catalog = FileCatalog()
+
+# Files uploaded through /upload (files table), indexed by their file ID
+stored_files = FileIndex("id")
+
+class SharedStateFollower:
+    """
+    Keeps this process's in-memory indexes in step with the other processes. 🔄
+    Uploads and channel posts can land in any webhook worker or bot worker,
+    so new rows in the files table are added to the stored file index and
+    new or edited rows in the catalog table to the catalog.
+    The files table is followed from the highest ID read from the database,
+    not the index's own last ID: this process's uploads are added to the
+    index as they happen and would otherwise skip past rows that other
+    processes stored just before them.
+    """
+
+    def __init__(self, interval: float = SHARED_STATE_INTERVAL):
+        self.interval = interval
+        self.last_file_id = 0
+        self._stopping = None
+        self._task = None
+
+    def start(self):
+        """Start following shared state from the stored file index loaded at startup. 🚀"""
+        self.last_file_id = stored_files.last_id
+        self._stopping = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop following shared state. 🛑"""
+        if self._task:
+            self._stopping.set()
+            await self._task
+            self._task = None
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                try:
+                    await self.refresh()
+                except Exception as e:
+                    logger.error(f"🚨 Shared state refresh failed: {str(e)}")
+
+    async def refresh(self):
+        """Pick up files and catalog posts added by other processes. 📥"""
+        for record in await run_blocking(get_stored_files, self.last_file_id):
+            stored_files.add(record)
+            self.last_file_id = max(self.last_file_id, record.key())
+        await catalog.refresh()
+
+shared_state = SharedStateFollower()
@@ -0,0 +1,52 @@
+import logging
+from collections import Counter
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+class StoreCounters:
+    """
+    In-memory aggregate counts over the SQLite stores. 📊
+    Seeded when storage is opened and updated by the storage helpers that
+    add users, files and cloned bots, so /stats and activity logging never
+    have to count rows in the database.
+    """
+
+    def __init__(self):
+        self.users_per_bot = Counter()
+        self.total_files = 0
+        self.bots_per_owner = Counter()
+
+    @property
+    def total_users(self) -> int:
+        return sum(self.users_per_bot.values())
+
+    @property
+    def total_bots(self) -> int:
+        return sum(self.bots_per_owner.values())
+
+    def set_users(self, bot_id: int, count: int):
+        """Record the current number of users of one bot. 👥"""
+        self.users_per_bot[bot_id] = count
+
+    def set_user_counts(self, counts: Dict[int, int]):
+        """Record the number of users of every bot. 👥"""
+        self.users_per_bot = Counter(counts)
+
+    def users_for(self, bot_id: int) -> int:
+        """Return how many users a bot has. 🔢"""
+        return self.users_per_bot.get(bot_id, 0)
+
+    def set_files(self, count: int):
+        """Record the current number of stored files. 📁"""
+        self.total_files = count
+
+    def set_cloned_bots(self, bots: List[Dict]):
+        """Recount cloned bots per owner. 🤖"""
+        self.bots_per_owner = Counter(str(bot.get("owner_id")) for bot in bots)
+
+    def bots_for(self, owner_id: str) -> int:
+        """Return how many cloned bots an owner has. 🔢"""
+        return self.bots_per_owner.get(str(owner_id), 0)
+
+counters = StoreCounters()
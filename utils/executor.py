@@ -0,0 +1,37 @@
+import os
+import asyncio
+import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+BLOCKING_WORKERS = int(os.getenv("BLOCKING_WORKERS", "8"))  # Threads for blocking disk and network work
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+def get_executor() -> ThreadPoolExecutor:
+    """Return the shared bounded thread pool for blocking work. 🧵"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=BLOCKING_WORKERS, thread_name_prefix="blocking")
+    return _executor
+
+async def run_blocking(func: Callable, *args, **kwargs):
+    """
+    Run a blocking call in the shared thread pool and await its result. ⏳
+    Keeps slow disk or network calls off the event loop so they never delay
+    other users' updates. The pool is bounded, so a burst of slow calls
+    queues instead of spawning unbounded threads.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
+
+def shutdown_executor():
+    """Wait for running blocking calls and stop the thread pool. 🔌"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+        logger.info("ℹ️ Blocking executor stopped")
@@ -1,6 +1,11 @@
+import asyncio
 import logging
 import os
 from logging.handlers import RotatingFileHandler
+from collections import deque
+from typing import List
+from telegram.error import RetryAfter
+from utils.counters import counters
 
 def setup_logging():
     """Set up logging with rotation for the bot. 📜"""
@@ -29,3 +34,118 @@ def setup_logging():
     logger.addHandler(console_handler)
 
     logging.info("✅ Logging setup completed")
+
+LOG_BATCH_INTERVAL = 5  # Seconds between batched log channel messages
+LOG_QUEUE_SIZE = 1000  # Events held before new ones are dropped
+LOG_MESSAGE_LIMIT = 4000  # Stay under Telegram's 4096 character limit
+
+class LogChannelQueue:
+    """
+    Background pipeline for log channel messages. 📜
+    Handlers only enqueue events; a background task coalesces them into
+    batched messages every few seconds. When the queue is full new events
+    are dropped and counted instead of slowing down the handler.
+    """
+
+    def __init__(self, maxsize: int = LOG_QUEUE_SIZE, interval: float = LOG_BATCH_INTERVAL):
+        self.interval = interval
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._queue = deque()
+        self._bot = None
+        self._chat_id = None
+        self._stopping = None
+        self._task = None
+
+    def put(self, message: str):
+        """Queue a log event without waiting. 📥"""
+        if len(self._queue) >= self.maxsize:
+            self.dropped += 1
+            return
+        self._queue.append(message)
+
+    def start(self, bot):
+        """Start the background flusher for the given bot. 🚀"""
+        self._chat_id = os.getenv("LOG_CHANNEL_ID")
+        if not self._chat_id:
+            logging.error("🚨 LOG_CHANNEL_ID not set in environment variables")
+        self._bot = bot
+        self._stopping = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flusher once everything still queued has been sent. 🛑"""
+        if self._task:
+            self._stopping.set()
+            await self._task
+            self._task = None
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except Exception as e:
+                logging.error(f"🚨 Log channel flush failed: {str(e)}")
+
+    def _drain(self) -> List[str]:
+        events = list(self._queue)
+        self._queue.clear()
+        if self.dropped:
+            events.append(f"⚠️ {self.dropped} log events dropped (queue full)")
+            self.dropped = 0
+        return events
+
+    async def flush(self):
+        """Send all queued events as as few messages as possible. 📤"""
+        if not self._bot:
+            return
+        events = self._drain()
+        if not events or not self._chat_id:
+            return
+
+        batches, current = [], ""
+        for event in events:
+            entry = f"📝 {event}"[:LOG_MESSAGE_LIMIT]
+            if current and len(current) + len(entry) + 2 > LOG_MESSAGE_LIMIT:
+                batches.append(current)
+                current = ""
+            current = f"{current}\n\n{entry}" if current else entry
+        batches.append(current)
+
+        for batch in batches:
+            try:
+                await self._bot.send_message(chat_id=self._chat_id, text=batch)
+            except RetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+                try:
+                    await self._bot.send_message(chat_id=self._chat_id, text=batch)
+                except Exception as e:
+                    logging.error(f"🚨 Failed to send log batch to channel {self._chat_id}: {str(e)}")
+            except Exception as e:
+                logging.error(f"🚨 Failed to send log batch to channel {self._chat_id}: {str(e)}")
+        logging.info(f"✅ Sent {len(events)} log events to channel {self._chat_id} in {len(batches)} messages")
+
+log_queue = LogChannelQueue()
+
+def send_log_to_channel(context, message: str):
+    """Queue a log message for the Telegram log channel. 📜"""
+    log_queue.put(message)
+
+def log_user_activity(context, user_id: str, username: str, action: str):
+    """Log user activity in a table format to the log channel. 📊"""
+    table = (
+        "📊 **User Activity Log** 📊\n\n"
+        "┌───────────────────────────────┐\n"
+        f"│ 🆔 **User ID**: {user_id}\n"
+        f"│ 👤 **Username**: @{username}\n"
+        f"│ 🛠️ **Action**: {action}\n"
+        f"│ 🤖 **Created Bots**: {counters.bots_for(user_id)}\n"
+        f"│ 📁 **Total Files in Bot**: {counters.total_files}\n"
+        f"│ 👥 **Total Users**: {counters.total_users}\n"
+        "└───────────────────────────────┘"
+    )
+    send_log_to_channel(context, table)
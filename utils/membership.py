@@ -0,0 +1,60 @@
+import asyncio
+import logging
+from typing import List, Optional, Tuple
+from utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+MEMBERSHIP_CACHE_SIZE = 100000
+MEMBERSHIP_CACHE_TTL = 600  # Seconds a verified membership is trusted
+
+# (user_id, channel) -> True for users verified as members
+membership_cache = TTLCache(MEMBERSHIP_CACHE_SIZE, MEMBERSHIP_CACHE_TTL)
+
+def channel_key(channel: str) -> str:
+    """Normalize a force subscription channel to its @username form. 🔗"""
+    channel = str(channel)
+    if channel.lstrip("-").isdigit():
+        return channel
+    return (channel if channel.startswith("@") else f"@{channel}").lower()
+
+async def check_subscriptions(bot, user_id: str, channels: List[str]) -> Tuple[List[str], Optional[Tuple[str, Exception]]]:
+    """
+    Check a user's membership in all force subscription channels at once. 🔒
+    Cached members are skipped; the remaining channels are checked
+    concurrently. Returns the channels the user still has to join and the
+    first (channel, error) if a check failed.
+    """
+    pending = []
+    for channel in channels:
+        chat_id = channel if channel.startswith("@") else f"@{channel}"
+        if not membership_cache.get((str(user_id), channel_key(chat_id))):
+            pending.append(chat_id)
+    if not pending:
+        return [], None
+
+    results = await asyncio.gather(
+        *(bot.get_chat_member(chat_id=chat_id, user_id=user_id) for chat_id in pending),
+        return_exceptions=True
+    )
+
+    missing = []
+    for chat_id, result in zip(pending, results):
+        if isinstance(result, Exception):
+            return missing, (chat_id, result)
+        if result.status in ["left", "kicked"]:
+            missing.append(chat_id)
+        else:
+            membership_cache.set((str(user_id), channel_key(chat_id)), True)
+    return missing, None
+
+def update_membership(chat, user_id: str, status: str):
+    """Refresh or invalidate a cached membership from a chat member update. 🔄"""
+    keys = [channel_key(chat.id)]
+    if chat.username:
+        keys.append(channel_key(chat.username))
+    for key in keys:
+        if status in ["left", "kicked"]:
+            membership_cache.pop((str(user_id), key))
+        else:
+            membership_cache.set((str(user_id), key), True)
@@ -0,0 +1,123 @@
+import os
+import json
+import asyncio
+import logging
+import tempfile
+from typing import Callable, Dict, Tuple
+from utils.executor import run_blocking
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 2  # Seconds between coalesced writes
+
+def atomic_write_json(path: str, data):
+    """
+    Write JSON so readers see either the old or the new file, never a partial one. 💾
+    The data goes to a temporary file in the same directory, is fsynced, and
+    then renamed over the target.
+    """
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+class DebouncedFlusher:
+    """
+    Coalesces bursts of changes into one write per store per interval. ⏳
+    Stores call mark_dirty with a snapshot function returning the path and
+    data to write instead of saving directly. A background task takes each
+    dirty snapshot once per interval on the event loop and writes it in the
+    blocking executor; stop() runs a final flush so nothing is lost on
+    shutdown.
+    """
+
+    def __init__(self, interval: float = FLUSH_INTERVAL):
+        self.interval = interval
+        self._dirty: Dict[str, Callable[[], Tuple[str, object]]] = {}
+        self._stopping = None
+        self._task = None
+
+    def mark_dirty(self, name: str, snapshot: Callable[[], Tuple[str, object]]):
+        """Schedule a store to be saved on the next flush. 📝"""
+        self._dirty[name] = snapshot
+
+    def start(self):
+        """Start the background flusher. 🚀"""
+        self._stopping = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flusher and write everything still pending. 🛑"""
+        if self._task:
+            self._stopping.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    async def flush(self):
+        """Write every dirty store once. 📤"""
+        dirty, self._dirty = self._dirty, {}
+        for name, snapshot in dirty.items():
+            try:
+                # The snapshot is taken on the event loop so the data cannot change mid-write
+                path, data = snapshot()
+                await run_blocking(atomic_write_json, path, data)
+            except Exception as e:
+                logger.error(f"🚨 Failed to flush {name}: {str(e)}")
+
+class PeriodicJob:
+    """
+    Runs a store maintenance function in the background every interval. 🔁
+    Used for sweeps that would otherwise need a scan on the request path.
+    The function runs in the blocking executor, off the event loop.
+    """
+
+    def __init__(self, name: str, func: Callable[[], object], interval: float):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self._stopping = None
+        self._task = None
+
+    def start(self):
+        """Start running the job. 🚀"""
+        self._stopping = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop running the job. 🛑"""
+        if self._task:
+            self._stopping.set()
+            await self._task
+            self._task = None
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                try:
+                    await run_blocking(self.func)
+                except Exception as e:
+                    logger.error(f"🚨 {self.name} failed: {str(e)}")
+
+flusher = DebouncedFlusher()
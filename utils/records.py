@@ -0,0 +1,151 @@
+import sys
+from datetime import date
+from typing import Dict, Optional, Union
+
+FIELDS = ("id", "start_id", "filename", "size", "gdtot_link", "upload_date")
+SIZE_UNITS = ("B", "KB", "MB", "GB", "TB")
+
+def parse_size(text: str) -> Optional[int]:
+    """Parse a size string such as '2.5 GB' into bytes. 📏"""
+    try:
+        value, unit = text.split()
+        return int(float(value) * 1024 ** SIZE_UNITS.index(unit.upper()))
+    except (AttributeError, ValueError):
+        return None
+
+def format_size(size_bytes: int) -> str:
+    """Format a byte count the way sizes are written in the database channel. 📏"""
+    value, unit = float(size_bytes), 0
+    while value >= 1024 and unit < len(SIZE_UNITS) - 1:
+        value /= 1024
+        unit += 1
+    return f"{round(value, 2):g} {SIZE_UNITS[unit]}"
+
+def _compact(value, parse):
+    """Store a value as a number when it round-trips, else as an interned string. 🗜️"""
+    if value is None:
+        return None
+    number = parse(value)
+    return number if number is not None else sys.intern(str(value))
+
+def _parse_id(text) -> Optional[int]:
+    text = str(text)
+    return int(text) if text.isdigit() and str(int(text)) == text else None
+
+def compact_id(value) -> Optional[Union[int, str]]:
+    """Return an ID the way records store it: an int when it round-trips, else an interned string. 🔑"""
+    return _compact(value, _parse_id)
+
+# Upload dates repeat across many records, so each day's ordinal is shared
+_dates: Dict[int, int] = {}
+
+def _parse_date(text) -> Optional[int]:
+    try:
+        parsed = date.fromisoformat(text)
+    except (TypeError, ValueError):
+        return None
+    if parsed.isoformat() != text:
+        return None
+    ordinal = parsed.toordinal()
+    return _dates.setdefault(ordinal, ordinal)
+
+def _parse_size(text) -> Optional[int]:
+    size_bytes = parse_size(text)
+    return size_bytes if size_bytes is not None and format_size(size_bytes) == text else None
+
+class FileRecord:
+    """
+    Compact, read-only file entry for the catalog and stored file indexes. 🗜️
+    IDs, sizes and dates are kept as ints and repeated strings are interned,
+    so a record is a fraction of the size of the equivalent dict. Values
+    that do not round-trip exactly are kept as strings. Records support
+    the dict read API (record["filename"], record.get("size")), so handlers
+    use them like the dicts they replace.
+    """
+
+    __slots__ = ("_id", "_start_id", "filename", "_size", "gdtot_link", "_date")
+
+    def __init__(self, id, start_id, filename: str, size, gdtot_link: Optional[str], upload_date):
+        self._id = _compact(id, _parse_id)
+        start_id = _compact(start_id, _parse_id)
+        # Most start IDs equal the file ID, so only store the ones that differ
+        self._start_id = None if start_id == self._id else start_id
+        self.filename = filename
+        self._size = _compact(size, _parse_size)
+        self.gdtot_link = gdtot_link
+        self._date = _compact(upload_date, _parse_date)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "FileRecord":
+        """Build a record from a file metadata dict. 📥"""
+        return cls(
+            data.get("id"),
+            data.get("start_id", data.get("id")),
+            data.get("filename", ""),
+            data.get("size"),
+            data.get("gdtot_link"),
+            data.get("upload_date")
+        )
+
+    @property
+    def id(self) -> Optional[str]:
+        return None if self._id is None else str(self._id)
+
+    @property
+    def start_id(self) -> Optional[str]:
+        return self.id if self._start_id is None else str(self._start_id)
+
+    @property
+    def size(self) -> Optional[str]:
+        return format_size(self._size) if isinstance(self._size, int) else self._size
+
+    @property
+    def size_bytes(self) -> Optional[int]:
+        return self._size if isinstance(self._size, int) else None
+
+    @property
+    def upload_date(self) -> Optional[str]:
+        return date.fromordinal(self._date).isoformat() if isinstance(self._date, int) else self._date
+
+    def key(self, field: str = "id") -> Optional[Union[int, str]]:
+        """Return the stored id or start_id without converting it to a string. 🔑"""
+        if field == "start_id" and self._start_id is not None:
+            return self._start_id
+        return self._id
+
+    def __getitem__(self, key: str):
+        if key not in FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in FIELDS and getattr(self, key) is not None
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (FileRecord, dict)):
+            return self.to_dict() == {key: other.get(key) for key in FIELDS}
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"FileRecord({self.to_dict()!r})"
+
+    def get(self, key: str, default=None):
+        """Return a field, or default when it is unset. 🔍"""
+        value = getattr(self, key) if key in FIELDS else None
+        return default if value is None else value
+
+    def keys(self):
+        return [key for key in FIELDS if getattr(self, key) is not None]
+
+    def to_dict(self) -> Dict:
+        """Return the record as a plain dict, e.g. for JSON snapshots. 📋"""
+        return {key: getattr(self, key) for key in FIELDS}
+
+def as_record(file: Union[Dict, FileRecord]) -> FileRecord:
+    """Convert file metadata to a FileRecord if it is not one already. 🔄"""
+    return file if isinstance(file, FileRecord) else FileRecord.from_dict(file)
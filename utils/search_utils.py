@@ -1,43 +1,207 @@
+import heapq
 import logging
-from typing import List, Dict
+import time
+from array import array
+from fuzzywuzzy import fuzz
+from typing import List, Dict, Iterable, Mapping, Optional
 
 logger = logging.getLogger(__name__)
 
-def search_files(query: str, files: List[Dict], limit: int = 5) -> List[Dict]:
+FUZZY_MIN_SCORE = 70  # Minimum WRatio for a fuzzy match
+FUZZY_SHORTLIST = 50  # Candidates that get full edit-distance scoring
+FUZZY_MAX_POSTINGS = 0.05  # Trigrams in more than 5% of files are too common to prefilter on
+FUZZY_TIME_BUDGET = 0.05  # Seconds of edit-distance scoring per query
+
+def normalize(text: str) -> str:
+    """Normalize a query or filename for matching. 🔡"""
+    return (text or "").lower().strip()
+
+def trigrams(text: str) -> set:
+    """Return the set of character trigrams in a string. 🧩"""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class SearchIndex:
     """
-    Search for files matching the query with AI-like logic. 🔍
-    Scores files based on exact match, word match, and partial match.
+    Persistent in-memory inverted index over filenames. 🗂️
+    Words and character trigrams map to posting lists of document numbers,
+    so a query only touches files that share a word or trigram with it.
+    Documents are the records' own int IDs and records are looked up in the
+    mapping shared with the catalog's ID index, so the index holds nothing
+    per file beyond its postings; filenames are lowercased when scored.
+    Scoring is the same as before: exact match 100, each common word 20,
+    substring match 10.
+    Queries shorter than a trigram are matched through the trigrams that
+    hold them right after their first character, which every occurrence in
+    a space-padded filename has, so they never scan the whole catalog.
     """
-    if not query or not files:
-        return []
 
-    query = query.lower().strip()
-    scored_files = []
+    def __init__(self, records: Mapping, key: str = "id"):
+        self.records = records
+        self.key = key
+        self._words: Dict[str, array] = {}
+        self._grams: Dict[str, array] = {}
+        self._short_grams: Dict[str, set] = {}
+
+    def __len__(self):
+        return len(self.records)
+
+    def _doc(self, file) -> Optional[int]:
+        doc = file.key(self.key)
+        return doc if isinstance(doc, int) else None
+
+    def add(self, file):
+        """
+        Index a record that the shared mapping holds, or is about to hold. ➕
+        Records without a numeric ID or a filename are not searchable.
+        """
+        doc = self._doc(file)
+        filename = normalize(file.filename)
+        if doc is None or not filename:
+            return
+        for word in set(filename.split()):
+            self._words.setdefault(word, array("I")).append(doc)
+        for gram in trigrams(f" {filename} "):
+            posting = self._grams.get(gram)
+            if posting is None:
+                posting = self._grams[gram] = array("I")
+                for part in (gram[1], gram[1:]):
+                    self._short_grams.setdefault(part, set()).add(gram)
+            posting.append(doc)
+
+    def remove(self, file):
+        """Drop a record's postings, e.g. before it is replaced by an edit. ➖"""
+        doc = self._doc(file)
+        filename = normalize(file.filename)
+        if doc is None or not filename:
+            return
+        for postings, terms in ((self._words, set(filename.split())), (self._grams, trigrams(f" {filename} "))):
+            for term in terms:
+                posting = postings.get(term)
+                if posting is None:
+                    continue
+                try:
+                    posting.remove(doc)
+                except ValueError:
+                    continue
+                if not posting:
+                    del postings[term]
+                    if postings is self._grams:
+                        self._forget_short(term)
+
+    def _forget_short(self, gram: str):
+        for part in (gram[1], gram[1:]):
+            grams = self._short_grams.get(part)
+            if grams is not None:
+                grams.discard(gram)
+                if not grams:
+                    del self._short_grams[part]
+
+    def _name(self, doc: int) -> str:
+        return normalize(self.records[doc].filename)
 
-    for file in files:
-        filename = file.get("filename", "").lower()
-        if not filename:
-            continue
+    def _substring_candidates(self, query: str) -> Iterable[int]:
+        """Return documents that could contain the query as a substring. 🔡"""
+        if len(query) < 3:
+            docs = set()
+            for gram in self._short_grams.get(query, ()):
+                docs.update(self._grams[gram])
+            return docs
+        postings = []
+        for gram in trigrams(query):
+            posting = self._grams.get(gram)
+            if posting is None:
+                return ()
+            postings.append(posting)
+        return min(postings, key=len)
 
-        score = 0
+    def search(self, query: str, limit: int = 5, fuzzy: bool = False) -> List:
+        """
+        Score matching files and return the top results. 🔍
+        With fuzzy=True, remaining slots are filled with typo-tolerant matches.
+        """
+        query = normalize(query)
+        if not query or not self.records:
+            return []
 
-        # Exact match (highest score) 🎯
-        if query == filename:
-            score += 100
+        results = self._ranked_search(query, limit)
+        if fuzzy and len(results) < limit:
+            found = {id(file) for file in results}
+            for file in self.fuzzy_search(query, limit):
+                if len(results) >= limit:
+                    break
+                if id(file) not in found:
+                    results.append(file)
+        return results
+
+    def _trigram_shortlist(self, query: str, size: int) -> List[int]:
+        """
+        Pick the files sharing the most trigrams with the query. 🧩
+        Trigrams common to a large share of the catalog are skipped, so the
+        prefilter cost stays bounded as the catalog grows.
+        """
+        grams = trigrams(f" {query} ")
+        max_postings = max(1000, int(len(self.records) * FUZZY_MAX_POSTINGS))
+        postings = [self._grams[gram] for gram in grams if gram in self._grams]
+        selective = [posting for posting in postings if len(posting) <= max_postings]
+        if not selective:
+            # Only common trigrams matched, fall back to the rarest few
+            selective = sorted(postings, key=len)[:3]
+
+        overlap: Dict[int, int] = {}
+        for posting in selective:
+            for doc in posting:
+                overlap[doc] = overlap.get(doc, 0) + 1
+        top = heapq.nlargest(size, overlap.items(), key=lambda item: (item[1], -item[0]))
+        return [doc for doc, count in top]
+
+    def fuzzy_search(self, query: str, limit: int = 5) -> List:
+        """
+        Typo-tolerant search for misspelled titles. 🔮
+        A trigram prefilter builds a small shortlist and only that shortlist
+        is scored by edit distance, within a fixed time budget.
+        """
+        query = normalize(query)
+        if len(query) < 3 or not self.records:
+            return []
+
+        deadline = time.monotonic() + FUZZY_TIME_BUDGET
+        scored = []
+        for doc in self._trigram_shortlist(query, FUZZY_SHORTLIST):
+            score = fuzz.WRatio(query, self._name(doc))
+            if score >= FUZZY_MIN_SCORE:
+                scored.append((doc, score))
+            if time.monotonic() > deadline:
+                logger.info(f"ℹ️ Fuzzy search for '{query}' hit its time budget")
+                break
+
+        top = heapq.nlargest(limit, scored, key=lambda item: (item[1], -item[0]))
+        return [self.records[doc] for doc, score in top]
+
+    def _ranked_search(self, query: str, limit: int) -> List:
+        """Exact, word and substring scoring over the posting lists. 📊"""
+        scores: Dict[int, int] = {}
+
+        # Word match, one pass over each query word's posting list 📝
+        for word in set(query.split()):
+            for doc in self._words.get(word, ()):
+                scores[doc] = scores.get(doc, 0) + 20
+
+        # Exact and partial match, verified on the rarest trigram's postings 🔡
+        if len(query) < 3:
+            # Short query candidates always contain it, only a one-word name can equal it
+            for doc in self._substring_candidates(query):
+                scores[doc] = scores.get(doc, 0) + 10
+            for doc in self._words.get(query, ()):
+                if self._name(doc) == query:
+                    scores[doc] = 100
         else:
-            # Word match (split query and filename into words) 📝
-            query_words = set(query.split())
-            filename_words = set(filename.split())
-            common_words = query_words.intersection(filename_words)
-            score += len(common_words) * 20
-
-            # Partial match (check if query is a substring of filename) 🔡
-            if query in filename:
-                score += 10
-
-        if score > 0:
-            scored_files.append((file, score))
-
-    # Sort by score in descending order and limit results 📊
-    scored_files.sort(key=lambda x: x[1], reverse=True)
-    return [file for file, score in scored_files[:limit]]
+            for doc in self._substring_candidates(query):
+                name = self._name(doc)
+                if name == query:
+                    scores[doc] = 100
+                elif query in name:
+                    scores[doc] = scores.get(doc, 0) + 10
+
+        # Bounded top-k heap, ties keep catalog order 📊
+        top = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+        return [self.records[doc] for doc, score in top]
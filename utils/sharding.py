@@ -0,0 +1,39 @@
+import hashlib
+from typing import Optional
+
+def rendezvous_worker(key: str, count: int) -> int:
+    """
+    Pick the worker that owns a key by rendezvous (highest random weight) hashing. 🎯
+    Every worker gets a score for the key and the highest score wins, so
+    changing the worker count only moves the keys of the workers that were
+    added or removed.
+    """
+    if count <= 1:
+        return 0
+    return max(range(count), key=lambda worker: hashlib.sha1(f"{worker}:{key}".encode()).digest())
+
+class Shard:
+    """
+    The slice of hosted bots this process is responsible for. 🧩
+    A process without an index (a webhook worker that found no free slot)
+    owns no clones at all.
+    """
+
+    def __init__(self, index: Optional[int] = 0, count: int = 1):
+        self.index = index
+        self.count = count
+
+    @property
+    def sharded(self) -> bool:
+        return self.count > 1
+
+    def configure(self, index: Optional[int], count: int):
+        """Set this process's worker index and the total worker count. ⚙️"""
+        self.index = index
+        self.count = count
+
+    def owns(self, token: str) -> bool:
+        """Check whether a cloned bot runs in this process. 🔍"""
+        return self.index is not None and rendezvous_worker(token, self.count) == self.index
+
+shard = Shard()
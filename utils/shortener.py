@@ -0,0 +1,95 @@
+import time
+import json
+import asyncio
+import logging
+from typing import Dict, Optional
+from utils.http_client import get_http_client
+from utils.persistence import flusher
+
+logger = logging.getLogger(__name__)
+
+SHORT_URLS_PATH = "/opt/render/project/src/data/short_urls.json"
+GPLINKS_API_URL = "https://gplinks.co/api"
+SHORT_URL_TTL = 7 * 24 * 3600  # Seconds a shortened link is reused
+
+class ShortUrlCache:
+    """
+    Persistent long URL to short URL cache with expiry. 🔗
+    Concurrent requests for the same URL share one shortener call.
+    Expired entries are dropped when the cache is flushed to disk.
+    """
+
+    def __init__(self, path: str = SHORT_URLS_PATH, ttl: float = SHORT_URL_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._entries: Optional[Dict[str, Dict]] = None
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    def _load(self) -> Dict[str, Dict]:
+        if self._entries is None:
+            try:
+                with open(self.path, "r") as f:
+                    self._entries = json.load(f)
+            except FileNotFoundError:
+                self._entries = {}
+            except Exception as e:
+                logger.error(f"🚨 Failed to load short URL cache: {str(e)}")
+                self._entries = {}
+        return self._entries
+
+    def _snapshot(self):
+        now = time.time()
+        for expired in [key for key, entry in self._entries.items() if entry["expires"] <= now]:
+            del self._entries[expired]
+        return self.path, dict(self._entries)
+
+    def get(self, url: str) -> Optional[str]:
+        """Return a cached short URL if it has not expired. 🔍"""
+        entry = self._load().get(url)
+        if entry and entry["expires"] > time.time():
+            return entry["short"]
+        return None
+
+    def set(self, url: str, short_url: str):
+        """Remember a short URL. 💾"""
+        self._load()[url] = {"short": short_url, "expires": time.time() + self.ttl}
+        flusher.mark_dirty("short URL cache", self._snapshot)
+
+    async def shorten(self, url: str, api_key: str) -> str:
+        """Shorten a URL at most once per TTL, falling back to the raw URL on errors. 🔗"""
+        cached = self.get(url)
+        if cached:
+            return cached
+
+        pending = self._pending.get(url)
+        if pending:
+            # Shielded so a cancelled waiter does not cancel the shared result
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[url] = future
+        try:
+            short_url = await request_short_url(url, api_key)
+            if short_url:
+                self.set(url, short_url)
+            future.set_result(short_url or url)
+        except Exception as e:
+            logger.error(f"🚨 Error shortening URL: {str(e)}")
+            future.set_result(url)
+        finally:
+            # If this call was cancelled, waiters fall back to the raw URL instead of hanging
+            if not future.done():
+                future.set_result(url)
+            self._pending.pop(url, None)
+        return future.result()
+
+async def request_short_url(url: str, api_key: str) -> Optional[str]:
+    """Call the GPLinks API through the shared HTTP client. 🌐"""
+    response = await get_http_client().get(GPLINKS_API_URL, params={"api": api_key, "url": url})
+    data = response.json()
+    if data.get("status") == "success":
+        return data.get("shortenedUrl")
+    logger.error(f"🚨 Failed to shorten URL: {data.get('message')}")
+    return None
+
+short_urls = ShortUrlCache()
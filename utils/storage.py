@@ -0,0 +1,776 @@
+import os
+import json
+import fcntl
+import sqlite3
+import logging
+import threading
+import time
+from types import MappingProxyType
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+from utils.counters import counters
+from utils.persistence import PeriodicJob
+from utils.records import FileRecord
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = "/opt/render/project/src/data"
+DB_PATH = os.path.join(DATA_DIR, "bot.db")
+MAINTENANCE_LOCK_PATH = os.path.join(DATA_DIR, "maintenance.lock")
+WORKER_SLOT_LOCK_PATH = os.path.join(DATA_DIR, "worker-{}.lock")
+SETTINGS_PATH = os.path.join(DATA_DIR, "settings.json")
+USERS_PATH = os.path.join(DATA_DIR, "users.json")
+FILES_STORAGE_PATH = os.path.join(DATA_DIR, "files.json")
+TOKEN_STORAGE_PATH = os.path.join(DATA_DIR, "tokens.json")
+CLONED_BOTS_PATH = os.path.join(DATA_DIR, "cloned_bots.json")
+CATALOG_SNAPSHOT_PATH = os.path.join(DATA_DIR, "catalog.json")
+
+DEFAULT_SETTINGS = {"force_subscription": False, "search_caption": "🔍 Search Result", "delete_timer": "0m", "forcesub_channels": ["@bot_paiyan_official"]}
+SETTINGS_RECHECK_INTERVAL = 1.0  # Seconds between checks for writes from other processes
+USERS_COMPACT_EVERY = 1000  # New users between journal compactions
+JOURNAL_COMPACT_INTERVAL = 60  # Seconds between checks whether the journal is due for compaction
+JOURNAL_CHECKPOINT_TIMEOUT = 1.0  # Seconds a compaction waits for busy readers before trying again later
+TOKEN_TTL = 24 * 3600  # Seconds a one-time link stays valid
+TOKEN_SWEEP_INTERVAL = 600  # Seconds between expired token sweeps
+TOKEN_SWEEP_BATCH = 1000  # Expired tokens deleted per statement
+CATALOG_PAGE_SIZE = 10000  # Catalog rows read per query
+PRIMARY_BOT_ID = 0  # bot_id of the main bot's users and broadcasts; clones use their Telegram bot ID
+RESULT_SET_TTL = 3600  # Seconds a compact search card's pages and buttons keep working
+RESULT_SET_SWEEP_INTERVAL = 600  # Seconds between expired result set sweeps
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT NOT NULL,
+    bot_id INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (bot_id, user_id)
+);
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    start_id TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    size TEXT,
+    gdtot_link TEXT,
+    upload_date TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_files_start_id ON files (start_id);
+CREATE TABLE IF NOT EXISTS tokens (
+    token TEXT PRIMARY KEY,
+    link TEXT NOT NULL,
+    expires_at REAL
+);
+CREATE TABLE IF NOT EXISTS cloned_bots (
+    token TEXT PRIMARY KEY,
+    owner_id TEXT NOT NULL,
+    created_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_cloned_bots_owner ON cloned_bots (owner_id);
+CREATE TABLE IF NOT EXISTS sequences (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO sequences (name, value) VALUES ('files', 0);
+CREATE TABLE IF NOT EXISTS broadcasts (
+    id INTEGER PRIMARY KEY,
+    message TEXT NOT NULL,
+    chat_id INTEGER NOT NULL,
+    progress_message_id INTEGER,
+    total INTEGER NOT NULL,
+    cursor INTEGER NOT NULL DEFAULT 0,
+    sent INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'running',
+    created_at TEXT,
+    bot_id INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS catalog (
+    message_id INTEGER PRIMARY KEY,
+    filename TEXT NOT NULL,
+    size TEXT,
+    gdtot_link TEXT,
+    upload_date TEXT,
+    version INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_catalog_version ON catalog (version);
+INSERT OR IGNORE INTO sequences (name, value) VALUES ('catalog_version', 0);
+INSERT OR IGNORE INTO sequences (name, value) VALUES ('catalog_high_water', 0);
+CREATE TABLE IF NOT EXISTS result_sets (
+    result_id TEXT PRIMARY KEY,
+    query TEXT NOT NULL,
+    caption TEXT,
+    start_ids TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_result_sets_expires_at ON result_sets (expires_at);
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id INTEGER PRIMARY KEY,
+    pid INTEGER,
+    bots INTEGER NOT NULL DEFAULT 0,
+    pending INTEGER NOT NULL DEFAULT 0,
+    processed INTEGER NOT NULL DEFAULT 0,
+    rss_kb INTEGER NOT NULL DEFAULT 0,
+    cpu_seconds REAL NOT NULL DEFAULT 0,
+    restarts INTEGER NOT NULL DEFAULT 0,
+    heartbeat_at REAL
+);
+"""
+
+# Statements are module constants so sqlite3's statement cache reuses them
+SQL_GET_SETTINGS = "SELECT key, value FROM settings"
+SQL_CLEAR_SETTINGS = "DELETE FROM settings"
+SQL_PUT_SETTING = "INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)"
+SQL_ADD_USER = "INSERT OR IGNORE INTO users (user_id, bot_id) VALUES (?, ?)"
+SQL_USERS_AFTER = "SELECT rowid, user_id FROM users WHERE bot_id = ? AND rowid > ? ORDER BY rowid LIMIT ?"
+SQL_USERS_BEFORE = "SELECT rowid, user_id FROM users WHERE bot_id = ? AND rowid < ? ORDER BY rowid DESC LIMIT ?"
+SQL_GET_FILES = "SELECT id, start_id, filename, size, gdtot_link, upload_date FROM files WHERE id > ? ORDER BY id"
+SQL_NEXT_CATALOG_VERSION = "UPDATE sequences SET value = value + 1 WHERE name = 'catalog_version' RETURNING value"
+SQL_PUT_CATALOG_ENTRY = "INSERT OR REPLACE INTO catalog (message_id, filename, size, gdtot_link, upload_date, version) VALUES (?, ?, ?, ?, ?, ?)"
+SQL_RAISE_CATALOG_HIGH_WATER = "UPDATE sequences SET value = MAX(value, ?) WHERE name = 'catalog_high_water'"
+SQL_SET_CATALOG_VERSION = "UPDATE sequences SET value = MAX(value, ?) WHERE name = 'catalog_version'"
+SQL_CATALOG_CHANGES = "SELECT message_id, filename, size, gdtot_link, upload_date, version FROM catalog WHERE version > ? ORDER BY version LIMIT ?"
+SQL_CATALOG_HIGH_WATER = "SELECT value FROM sequences WHERE name = 'catalog_high_water'"
+SQL_PUT_RESULT_SET = "INSERT OR REPLACE INTO result_sets (result_id, query, caption, start_ids, expires_at) VALUES (?, ?, ?, ?, ?)"
+SQL_GET_RESULT_SET = "SELECT query, caption, start_ids FROM result_sets WHERE result_id = ? AND expires_at > ?"
+SQL_SWEEP_RESULT_SETS = "DELETE FROM result_sets WHERE rowid IN (SELECT rowid FROM result_sets WHERE expires_at <= ? LIMIT ?)"
+SQL_WORKER_HEARTBEAT = (
+    "INSERT INTO workers (worker_id, pid, bots, pending, processed, rss_kb, cpu_seconds, heartbeat_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+    "ON CONFLICT (worker_id) DO UPDATE SET pid = excluded.pid, bots = excluded.bots, pending = excluded.pending, "
+    "processed = excluded.processed, rss_kb = excluded.rss_kb, cpu_seconds = excluded.cpu_seconds, heartbeat_at = excluded.heartbeat_at"
+)
+SQL_WORKER_RESTART = "INSERT INTO workers (worker_id, restarts) VALUES (?, 1) ON CONFLICT (worker_id) DO UPDATE SET restarts = restarts + 1"
+SQL_GET_WORKERS = "SELECT worker_id, pid, bots, pending, processed, rss_kb, cpu_seconds, restarts, heartbeat_at FROM workers WHERE worker_id < ? ORDER BY worker_id"
+SQL_WORKER_HEARTBEAT_AT = "SELECT heartbeat_at FROM workers WHERE worker_id = ?"
+SQL_CLEAR_WORKERS = "DELETE FROM workers"
+SQL_GET_FILE = "SELECT id, start_id, filename, size, gdtot_link, upload_date FROM files WHERE id = ?"
+SQL_IMPORT_FILE = "INSERT OR REPLACE INTO files (id, start_id, filename, size, gdtot_link, upload_date) VALUES (?, ?, ?, ?, ?, ?)"
+SQL_ADD_FILE = "INSERT INTO files (id, start_id, filename, size, gdtot_link, upload_date) VALUES (?, ?, ?, ?, ?, ?)"
+SQL_COUNT_FILES = "SELECT COUNT(*) FROM files"
+# Never hands out an ID at or below one already used, even after deletions
+SQL_NEXT_FILE_ID = "UPDATE sequences SET value = MAX(value, (SELECT COALESCE(MAX(id), 0) FROM files)) + 1 WHERE name = 'files' RETURNING value"
+SQL_PUT_TOKEN = "INSERT OR REPLACE INTO tokens (token, link, expires_at) VALUES (?, ?, ?)"
+SQL_POP_TOKEN = "DELETE FROM tokens WHERE token = ? RETURNING link, expires_at"
+SQL_SWEEP_TOKENS = "DELETE FROM tokens WHERE rowid IN (SELECT rowid FROM tokens WHERE expires_at <= ? LIMIT ?)"
+SQL_TOKEN_COLUMNS = "PRAGMA table_info(tokens)"
+SQL_ADD_TOKEN_EXPIRY = "ALTER TABLE tokens ADD COLUMN expires_at REAL"
+SQL_EXPIRE_LEGACY_TOKENS = "UPDATE tokens SET expires_at = ? WHERE expires_at IS NULL"
+SQL_INDEX_TOKEN_EXPIRY = "CREATE INDEX IF NOT EXISTS idx_tokens_expires_at ON tokens (expires_at)"
+SQL_GET_CLONED_BOTS = "SELECT token, owner_id, created_at FROM cloned_bots ORDER BY rowid"
+SQL_ADD_CLONED_BOT = "INSERT OR REPLACE INTO cloned_bots (token, owner_id, created_at) VALUES (?, ?, ?)"
+SQL_COUNT_OWNER_BOTS = "SELECT COUNT(*) FROM cloned_bots WHERE owner_id = ?"
+SQL_DATA_VERSION = "PRAGMA data_version"
+SQL_GET_USER_IDS = "SELECT bot_id, user_id FROM users"
+SQL_USER_COLUMNS = "PRAGMA table_info(users)"
+# Rebuilds a pre-tenant users table with every user on the main bot, keeping rowids as list positions
+SQL_SCOPE_USERS = (
+    "CREATE TABLE users_scoped (user_id TEXT NOT NULL, bot_id INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (bot_id, user_id));"
+    "INSERT INTO users_scoped (rowid, user_id, bot_id) SELECT rowid, user_id, 0 FROM users;"
+    "DROP TABLE users;"
+    "ALTER TABLE users_scoped RENAME TO users;"
+)
+SQL_INDEX_USERS_BOT = "CREATE INDEX IF NOT EXISTS idx_users_bot ON users (bot_id)"
+SQL_BROADCAST_COLUMNS = "PRAGMA table_info(broadcasts)"
+SQL_ADD_BROADCAST_BOT = "ALTER TABLE broadcasts ADD COLUMN bot_id INTEGER NOT NULL DEFAULT 0"
+SQL_CHECKPOINT = "PRAGMA wal_checkpoint(TRUNCATE)"
+SQL_ADD_BROADCAST = "INSERT INTO broadcasts (bot_id, message, chat_id, progress_message_id, total, created_at) VALUES (?, ?, ?, ?, ?, ?)"
+SQL_BROADCAST_PROGRESS = "UPDATE broadcasts SET cursor = ?, sent = ?, failed = ?, status = ? WHERE id = ?"
+SQL_BROADCAST_MESSAGE = "UPDATE broadcasts SET progress_message_id = ? WHERE id = ?"
+SQL_RUNNING_BROADCASTS = "SELECT id, bot_id, message, chat_id, progress_message_id, total, cursor, sent, failed, status FROM broadcasts WHERE bot_id = ? AND status = 'running' ORDER BY id"
+
+_conn: Optional[sqlite3.Connection] = None
+_lock = threading.RLock()
+_maintenance_lock = None
+_worker_slot_lock = None
+
+class UserRegistry:
+    """
+    Sets of registered user IDs, one per bot, for constant-time membership checks. 👥
+    The main bot and every clone keep their own users, so broadcasts and
+    user lists stay within one bot. Only users missing from their bot's set
+    are written, as a single-row insert into the users table; the SQLite
+    WAL acts as the append-only journal and is checkpointed back into the
+    database by journal_compactor once USERS_COMPACT_EVERY new users came in.
+    """
+
+    def __init__(self):
+        self._ids: Dict[int, set] = {}
+        self.loaded = False
+        self.since_compaction = 0
+
+    def __len__(self):
+        return sum(len(ids) for ids in self._ids.values())
+
+    def contains(self, bot_id: int, user_id) -> bool:
+        return str(user_id) in self._ids.get(bot_id, ())
+
+    def count(self, bot_id: int) -> int:
+        return len(self._ids.get(bot_id, ()))
+
+    def counts(self) -> Dict[int, int]:
+        """Return the number of users of each bot. 🔢"""
+        return {bot_id: len(ids) for bot_id, ids in self._ids.items()}
+
+    def load(self, rows: Iterable[Tuple[int, str]]):
+        """Replace the registry contents with (bot_id, user_id) rows, e.g. when the database is opened. 📂"""
+        self._ids = {}
+        for bot_id, user_id in rows:
+            self._ids.setdefault(bot_id, set()).add(user_id)
+        self.loaded = True
+        self.since_compaction = 0
+
+    def add(self, bot_id: int, user_id: str):
+        """Record a newly registered user. ➕"""
+        self._ids.setdefault(bot_id, set()).add(str(user_id))
+        self.since_compaction += 1
+
+    def clear(self):
+        """Forget all users so the next access reloads them. 🧹"""
+        self._ids = {}
+        self.loaded = False
+        self.since_compaction = 0
+
+user_registry = UserRegistry()
+
+_settings: Optional[Mapping] = None
+_settings_data_version = None
+_settings_checked_at = 0.0
+
+def get_connection() -> sqlite3.Connection:
+    """Open the SQLite database in WAL mode on first use. 🗄️"""
+    global _conn
+    with _lock:
+        if _conn is None:
+            os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+            _conn = sqlite3.connect(DB_PATH, check_same_thread=False, cached_statements=256)
+            _conn.execute("PRAGMA journal_mode=WAL")
+            _conn.execute("PRAGMA synchronous=NORMAL")
+            _conn.executescript(SCHEMA)
+            _upgrade_schema(_conn)
+        return _conn
+
+def acquire_maintenance_lock() -> bool:
+    """
+    Try to become the process that runs background maintenance. 🔒
+    When several worker processes share the database, only the holder of
+    this lock resumes broadcasts and sweeps tokens. The lock is released
+    when the process exits, however it exits.
+    """
+    global _maintenance_lock
+    if _maintenance_lock is None:
+        _maintenance_lock = _try_lock(MAINTENANCE_LOCK_PATH)
+    return _maintenance_lock is not None
+
+def acquire_worker_slot(count: int) -> Optional[int]:
+    """
+    Claim the first free worker slot out of `count`, returning its index. 🎟️
+    Webhook workers are forked by gunicorn without an index of their own, so
+    each one locks a slot to learn which shard of the cloned bots it hosts.
+    A restarted worker takes over the slot its predecessor released on exit.
+    Returns None if every slot is taken.
+    """
+    global _worker_slot_lock
+    if _worker_slot_lock is not None:
+        return _worker_slot_lock[0]
+    for index in range(count):
+        lock_file = _try_lock(WORKER_SLOT_LOCK_PATH.format(index))
+        if lock_file is not None:
+            _worker_slot_lock = (index, lock_file)
+            return index
+    return None
+
+def _try_lock(path: str):
+    """Take an exclusive lock on a file without waiting, returning the open file or None. 🔐"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    lock_file = open(path, "w")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+def _upgrade_schema(conn: sqlite3.Connection):
+    """Bring tables created by older versions up to the current schema. 🛠️"""
+    with conn:
+        if "expires_at" not in [row[1] for row in conn.execute(SQL_TOKEN_COLUMNS)]:
+            conn.execute(SQL_ADD_TOKEN_EXPIRY)
+        conn.execute(SQL_EXPIRE_LEGACY_TOKENS, (time.time() + TOKEN_TTL,))
+        conn.execute(SQL_INDEX_TOKEN_EXPIRY)
+        if "bot_id" not in [row[1] for row in conn.execute(SQL_BROADCAST_COLUMNS)]:
+            conn.execute(SQL_ADD_BROADCAST_BOT)
+    if "bot_id" not in [row[1] for row in conn.execute(SQL_USER_COLUMNS)]:
+        # executescript commits on its own, so the rebuild runs as one explicit transaction
+        conn.executescript(f"BEGIN; {SQL_SCOPE_USERS} COMMIT;")
+    conn.execute(SQL_INDEX_USERS_BOT)
+
+def close_storage():
+    """Close the database connection. 🔌"""
+    global _conn, _settings
+    with _lock:
+        if _conn is not None:
+            _conn.close()
+            _conn = None
+        _settings = None
+        user_registry.clear()
+
+def _file_record(row) -> FileRecord:
+    return FileRecord(*row)
+
+def _load_json(path, default):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+def migrate_json_files():
+    """
+    One-shot import of the legacy JSON stores into SQLite. 📦
+    Each imported file is renamed to *.migrated so it is never imported twice.
+    """
+    conn = get_connection()
+    sources = [SETTINGS_PATH, USERS_PATH, FILES_STORAGE_PATH, TOKEN_STORAGE_PATH, CLONED_BOTS_PATH]
+    if not any(os.path.exists(path) for path in sources):
+        return
+
+    with _lock, conn:
+        settings = _load_json(SETTINGS_PATH, {})
+        conn.executemany(SQL_PUT_SETTING, [(key, json.dumps(value)) for key, value in settings.items()])
+        users = _load_json(USERS_PATH, [])
+        conn.executemany(SQL_ADD_USER, [(str(user), PRIMARY_BOT_ID) for user in users])
+        files = _load_json(FILES_STORAGE_PATH, [])
+        conn.executemany(
+            SQL_IMPORT_FILE,
+            [(int(f["id"]), f.get("start_id", f["id"]), f.get("filename", ""), f.get("size"), f.get("gdtot_link"), f.get("upload_date")) for f in files]
+        )
+        tokens = _load_json(TOKEN_STORAGE_PATH, {})
+        expires_at = time.time() + TOKEN_TTL
+        conn.executemany(SQL_PUT_TOKEN, [(token, link, expires_at) for token, link in tokens.items()])
+        bots = _load_json(CLONED_BOTS_PATH, [])
+        conn.executemany(SQL_ADD_CLONED_BOT, [(b["token"], str(b["owner_id"]), b.get("created_at")) for b in bots])
+
+    for path in sources:
+        if os.path.exists(path):
+            os.replace(path, f"{path}.migrated")
+    logger.info(f"✅ Migrated JSON stores to SQLite: {len(settings)} settings, {len(users)} users, {len(files)} files, {len(tokens)} tokens, {len(bots)} cloned bots")
+
+def migrate_catalog_snapshot():
+    """
+    One-shot import of the legacy catalog.json snapshot into the catalog table. 📦
+    The snapshot is renamed to catalog.json.migrated afterwards.
+    """
+    if not os.path.exists(CATALOG_SNAPSHOT_PATH):
+        return
+    snapshot = _load_json(CATALOG_SNAPSHOT_PATH, {})
+    rows = [
+        (int(f["start_id"]), f.get("filename", ""), f.get("size"), f.get("gdtot_link"), f.get("upload_date"), version)
+        for version, f in enumerate(snapshot.get("files", []), 1)
+        if str(f.get("start_id", "")).isdigit()
+    ]
+    conn = get_connection()
+    with _lock, conn:
+        conn.executemany(SQL_PUT_CATALOG_ENTRY, rows)
+        conn.execute(SQL_SET_CATALOG_VERSION, (len(rows),))
+        conn.execute(SQL_RAISE_CATALOG_HIGH_WATER, (snapshot.get("last_message_id", 0),))
+    os.replace(CATALOG_SNAPSHOT_PATH, f"{CATALOG_SNAPSHOT_PATH}.migrated")
+    logger.info(f"✅ Migrated catalog snapshot to SQLite: {len(rows)} files")
+
+def init_storage():
+    """Open the database, migrate legacy JSON files and seed the counters. 🚀"""
+    get_connection()
+    try:
+        migrate_json_files()
+        migrate_catalog_snapshot()
+    except Exception as e:
+        logger.error(f"🚨 Failed to migrate JSON stores: {str(e)}")
+    _load_user_registry()
+    counters.set_user_counts(user_registry.counts())
+    counters.set_files(count_files())
+    counters.set_cloned_bots(get_cloned_bots())
+
+def _freeze(value):
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    return value
+
+def _thaw(value):
+    if isinstance(value, (tuple, list)):
+        return [_thaw(item) for item in value]
+    if isinstance(value, Mapping):
+        return {key: _thaw(item) for key, item in value.items()}
+    return value
+
+def _load_settings():
+    """Read settings from the database into a new immutable snapshot. 📥"""
+    global _settings, _settings_data_version, _settings_checked_at
+    conn = get_connection()
+    try:
+        with _lock:
+            _settings_data_version = conn.execute(SQL_DATA_VERSION).fetchone()[0]
+            rows = conn.execute(SQL_GET_SETTINGS).fetchall()
+    except Exception as e:
+        logger.error(f"🚨 Failed to load settings: {str(e)}")
+        rows = []
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update({key: json.loads(value) for key, value in rows})
+    _settings = _freeze(settings)
+    _settings_checked_at = time.monotonic()
+
+def settings_snapshot() -> Mapping:
+    """
+    Return the current settings as a read-only snapshot. ⚙️
+    The snapshot is replaced whenever save_settings writes. Writes made by
+    another process are noticed through SQLite's data_version, checked at
+    most once per SETTINGS_RECHECK_INTERVAL, so reads normally touch no disk.
+    """
+    global _settings_checked_at
+    with _lock:
+        if _settings is None:
+            _load_settings()
+        elif time.monotonic() - _settings_checked_at >= SETTINGS_RECHECK_INTERVAL:
+            _settings_checked_at = time.monotonic()
+            try:
+                data_version = get_connection().execute(SQL_DATA_VERSION).fetchone()[0]
+            except Exception as e:
+                logger.error(f"🚨 Failed to check settings version: {str(e)}")
+                data_version = _settings_data_version
+            if data_version != _settings_data_version:
+                _load_settings()
+        return _settings
+
+def get_settings() -> Dict:
+    """Load a mutable copy of the bot settings for editing. ⚙️"""
+    return _thaw(settings_snapshot())
+
+def save_settings(settings: Dict):
+    """Save bot settings and publish them as the new snapshot. 💾"""
+    try:
+        conn = get_connection()
+        with _lock:
+            with conn:
+                conn.execute(SQL_CLEAR_SETTINGS)
+                conn.executemany(SQL_PUT_SETTING, [(key, json.dumps(value)) for key, value in settings.items()])
+            _load_settings()
+    except Exception as e:
+        logger.error(f"🚨 Failed to save settings: {str(e)}")
+
+def get_users_page(bot_id: int = PRIMARY_BOT_ID, after: int = 0, limit: int = 50, before: Optional[int] = None) -> List[Tuple[int, str]]:
+    """
+    Return one page of a bot's (rowid, user_id) pairs in registration order. 📄
+    Pages are addressed by rowid cursors, so any page costs one index seek
+    no matter how deep into the list it is.
+    """
+    with _lock:
+        if before is not None:
+            rows = get_connection().execute(SQL_USERS_BEFORE, (bot_id, before, limit)).fetchall()
+            return rows[::-1]
+        return get_connection().execute(SQL_USERS_AFTER, (bot_id, after, limit)).fetchall()
+
+def iter_users(bot_id: int = PRIMARY_BOT_ID, batch_size: int = 1000) -> Iterator[Tuple[int, str]]:
+    """Yield all of a bot's (rowid, user_id) pairs, reading one page at a time. 🔁"""
+    after = 0
+    while True:
+        rows = get_users_page(bot_id, after, batch_size)
+        yield from rows
+        if len(rows) < batch_size:
+            return
+        after = rows[-1][0]
+
+def _load_user_registry():
+    """Fill the user registry from the database on first use. 📥"""
+    with _lock:
+        if not user_registry.loaded:
+            user_registry.load(get_connection().execute(SQL_GET_USER_IDS))
+
+def compact_storage() -> bool:
+    """
+    Checkpoint the write-ahead log into the database and truncate it. 🧹
+    The checkpoint runs on a connection of its own, outside the storage lock,
+    and waits at most JOURNAL_CHECKPOINT_TIMEOUT for readers to finish, so
+    other queries are never held up behind it. Returns True if it completed.
+    """
+    try:
+        conn = sqlite3.connect(DB_PATH, timeout=JOURNAL_CHECKPOINT_TIMEOUT)
+        try:
+            busy, pages, checkpointed = conn.execute(SQL_CHECKPOINT).fetchone()
+        finally:
+            conn.close()
+    except Exception as e:
+        logger.error(f"🚨 Failed to compact storage journal: {str(e)}")
+        return False
+    if busy:
+        logger.info(f"ℹ️ Storage journal busy, compaction postponed ({checkpointed}/{pages} pages checkpointed)")
+        return False
+    logger.info(f"ℹ️ Storage journal compacted ({checkpointed}/{pages} pages checkpointed)")
+    return True
+
+def compact_storage_if_due() -> bool:
+    """Compact the journal once USERS_COMPACT_EVERY users have been added since the last time. 🧹"""
+    with _lock:
+        added = user_registry.since_compaction
+    if added < USERS_COMPACT_EVERY or not compact_storage():
+        return False
+    with _lock:
+        user_registry.since_compaction = max(0, user_registry.since_compaction - added)
+    return True
+
+def count_users(bot_id: Optional[int] = None) -> int:
+    """Count a bot's registered users, or the users of all bots. 🔢"""
+    _load_user_registry()
+    return len(user_registry) if bot_id is None else user_registry.count(bot_id)
+
+def add_user(user_id: str, bot_id: int = PRIMARY_BOT_ID) -> bool:
+    """Register a user of a bot in constant time. Returns True if the user is new to that bot. ➕"""
+    user_id = str(user_id)
+    try:
+        _load_user_registry()
+        if user_registry.contains(bot_id, user_id):
+            return False
+        conn = get_connection()
+        with _lock:
+            with conn:
+                # Another process may have registered the user since the registry was loaded
+                added = conn.execute(SQL_ADD_USER, (user_id, bot_id)).rowcount > 0
+            user_registry.add(bot_id, user_id)
+        counters.set_users(bot_id, user_registry.count(bot_id))
+        return added
+    except Exception as e:
+        logger.error(f"🚨 Failed to save user {user_id}: {str(e)}")
+        return False
+
+def get_stored_files(after: int = 0) -> List[FileRecord]:
+    """Load stored files with IDs past `after` (all by default) ordered by ID. 📂"""
+    try:
+        with _lock:
+            return [_file_record(row) for row in get_connection().execute(SQL_GET_FILES, (after,))]
+    except Exception as e:
+        logger.error(f"🚨 Failed to load stored files: {str(e)}")
+        return []
+
+def get_stored_file(file_id) -> Optional[FileRecord]:
+    """Load one stored file by ID, None if there is none. 📁"""
+    try:
+        file_id = int(file_id)
+    except (TypeError, ValueError):
+        return None
+    try:
+        with _lock:
+            row = get_connection().execute(SQL_GET_FILE, (file_id,)).fetchone()
+        return _file_record(row) if row else None
+    except sqlite3.Error as e:
+        logger.error(f"🚨 Failed to load stored file {file_id}: {str(e)}")
+        return None
+
+def count_files() -> int:
+    """Count stored files. 🔢"""
+    with _lock:
+        return get_connection().execute(SQL_COUNT_FILES).fetchone()[0]
+
+def add_file(file_metadata: Dict) -> Optional[str]:
+    """
+    Store a new file record and return its ID. 💾
+    Records without an ID get the next one from a monotonic sequence, so IDs
+    are never reused. The start ID defaults to the file ID.
+    """
+    try:
+        conn = get_connection()
+        with _lock, conn:
+            if file_metadata.get("id") is None:
+                file_metadata["id"] = str(conn.execute(SQL_NEXT_FILE_ID).fetchone()[0])
+            file_metadata.setdefault("start_id", file_metadata["id"])
+            conn.execute(SQL_ADD_FILE, (
+                int(file_metadata["id"]),
+                file_metadata["start_id"],
+                file_metadata["filename"],
+                file_metadata.get("size"),
+                file_metadata.get("gdtot_link"),
+                file_metadata.get("upload_date")
+            ))
+        counters.set_files(counters.total_files + 1)
+        return file_metadata["id"]
+    except Exception as e:
+        logger.error(f"🚨 Failed to save file {file_metadata.get('id')}: {str(e)}")
+        return None
+
+def save_token(token: str, link: str, ttl: float = TOKEN_TTL):
+    """Store a one-time link token that expires after ttl seconds. 🔗"""
+    try:
+        conn = get_connection()
+        with _lock, conn:
+            conn.execute(SQL_PUT_TOKEN, (token, link, time.time() + ttl))
+    except Exception as e:
+        logger.error(f"🚨 Failed to save token: {str(e)}")
+
+def pop_token(token: str) -> Optional[str]:
+    """
+    Atomically consume a one-time link token. 🗑️
+    The row is deleted and returned by one statement, so a token can only be
+    used once even under concurrent clicks. Expired tokens return None.
+    """
+    try:
+        conn = get_connection()
+        with _lock, conn:
+            row = conn.execute(SQL_POP_TOKEN, (token,)).fetchone()
+    except Exception as e:
+        logger.error(f"🚨 Failed to use token: {str(e)}")
+        return None
+    if not row:
+        return None
+    link, expires_at = row
+    if expires_at is not None and expires_at <= time.time():
+        return None
+    return link
+
+def _sweep_expired(statement: str, name: str) -> int:
+    """Delete expired rows in small batches so writers are never blocked for long. 🧹"""
+    removed = 0
+    try:
+        conn = get_connection()
+        while True:
+            with _lock, conn:
+                deleted = conn.execute(statement, (time.time(), TOKEN_SWEEP_BATCH)).rowcount
+            removed += deleted
+            if deleted < TOKEN_SWEEP_BATCH:
+                break
+    except Exception as e:
+        logger.error(f"🚨 Failed to sweep expired {name}: {str(e)}")
+    if removed:
+        logger.info(f"ℹ️ Swept {removed} expired {name}")
+    return removed
+
+def sweep_expired_tokens() -> int:
+    """Delete expired one-time link tokens. 🧹"""
+    return _sweep_expired(SQL_SWEEP_TOKENS, "tokens")
+
+token_sweeper = PeriodicJob("Expired token sweep", sweep_expired_tokens, TOKEN_SWEEP_INTERVAL)
+journal_compactor = PeriodicJob("Storage journal compaction", compact_storage_if_due, JOURNAL_COMPACT_INTERVAL)
+
+def save_result_set(result_id: str, result_set: Dict, ttl: float = RESULT_SET_TTL):
+    """
+    Store the results behind a compact search card. 🗂️
+    Page and download buttons can land in any webhook worker, so the result
+    set is shared through the database rather than kept in one process.
+    """
+    conn = get_connection()
+    with _lock, conn:
+        conn.execute(SQL_PUT_RESULT_SET, (result_id, result_set["query"], result_set.get("caption"), json.dumps(result_set["start_ids"]), time.time() + ttl))
+
+def get_result_set(result_id: str) -> Optional[Dict]:
+    """Load a stored result set, or None once it has expired. 🔍"""
+    with _lock:
+        row = get_connection().execute(SQL_GET_RESULT_SET, (result_id, time.time())).fetchone()
+    if not row:
+        return None
+    return {"query": row[0], "caption": row[1], "start_ids": json.loads(row[2])}
+
+def sweep_expired_result_sets() -> int:
+    """Delete result sets whose cards have expired. 🧹"""
+    return _sweep_expired(SQL_SWEEP_RESULT_SETS, "result sets")
+
+result_set_sweeper = PeriodicJob("Expired result set sweep", sweep_expired_result_sets, RESULT_SET_SWEEP_INTERVAL)
+
+def save_catalog_entry(record: FileRecord, high_water: int):
+    """
+    Store one catalog entry under a new version and raise the high-water mark. 💾
+    Every write bumps the catalog version, so other processes pick up new and
+    edited entries by asking for versions past the last one they saw.
+    """
+    conn = get_connection()
+    with _lock, conn:
+        version = conn.execute(SQL_NEXT_CATALOG_VERSION).fetchone()[0]
+        conn.execute(SQL_PUT_CATALOG_ENTRY, (int(record.start_id), record.filename, record.size, record.gdtot_link, record.upload_date, version))
+        conn.execute(SQL_RAISE_CATALOG_HIGH_WATER, (high_water,))
+
+def save_catalog_high_water(message_id: int):
+    """Record that channel posts up to message_id have been read. 🔝"""
+    conn = get_connection()
+    with _lock, conn:
+        conn.execute(SQL_RAISE_CATALOG_HIGH_WATER, (message_id,))
+
+def get_catalog_changes(after_version: int = 0, limit: int = CATALOG_PAGE_SIZE) -> Tuple[List[Tuple[int, FileRecord]], int]:
+    """Return up to `limit` (version, record) pairs written after a version, and the high-water mark. 📥"""
+    with _lock:
+        conn = get_connection()
+        rows = conn.execute(SQL_CATALOG_CHANGES, (after_version, limit)).fetchall()
+        high_water = conn.execute(SQL_CATALOG_HIGH_WATER).fetchone()[0]
+    return [(row[5], FileRecord(row[0], row[0], row[1], row[2], row[3], row[4])) for row in rows], high_water
+
+def get_cloned_bots() -> List[Dict]:
+    """Load cloned bots. 🤖"""
+    try:
+        with _lock:
+            rows = get_connection().execute(SQL_GET_CLONED_BOTS).fetchall()
+        return [{"token": row[0], "owner_id": row[1], "created_at": row[2]} for row in rows]
+    except Exception as e:
+        logger.error(f"🚨 Failed to load cloned bots: {str(e)}")
+        return []
+
+def add_cloned_bot(bot: Dict):
+    """Store a cloned bot. 💾"""
+    try:
+        conn = get_connection()
+        with _lock, conn:
+            conn.execute(SQL_ADD_CLONED_BOT, (bot["token"], str(bot["owner_id"]), bot.get("created_at")))
+            owned = conn.execute(SQL_COUNT_OWNER_BOTS, (str(bot["owner_id"]),)).fetchone()[0]
+        counters.bots_per_owner[str(bot["owner_id"])] = owned
+    except Exception as e:
+        logger.error(f"🚨 Failed to save cloned bot: {str(e)}")
+
+def add_broadcast(bot_id: int, message: str, chat_id: int, total: int, created_at: str) -> int:
+    """Record a new broadcast to a bot's users and return its ID. 📢"""
+    conn = get_connection()
+    with _lock, conn:
+        return conn.execute(SQL_ADD_BROADCAST, (bot_id, message, chat_id, None, total, created_at)).lastrowid
+
+def set_broadcast_message(broadcast_id: int, message_id: int):
+    """Remember the progress message of a broadcast so it can be edited after a restart. 📝"""
+    conn = get_connection()
+    with _lock, conn:
+        conn.execute(SQL_BROADCAST_MESSAGE, (message_id, broadcast_id))
+
+def save_broadcast_progress(broadcast_id: int, cursor: int, sent: int, failed: int, status: str = "running"):
+    """Persist how far a broadcast has got. 💾"""
+    conn = get_connection()
+    with _lock, conn:
+        conn.execute(SQL_BROADCAST_PROGRESS, (cursor, sent, failed, status, broadcast_id))
+
+def get_running_broadcasts(bot_id: int) -> List[Dict]:
+    """Load a bot's broadcasts that have not finished yet. 📋"""
+    keys = ("id", "bot_id", "message", "chat_id", "progress_message_id", "total", "cursor", "sent", "failed", "status")
+    with _lock:
+        rows = get_connection().execute(SQL_RUNNING_BROADCASTS, (bot_id,)).fetchall()
+    return [dict(zip(keys, row)) for row in rows]
+
+def save_worker_heartbeat(worker_id: int, pid: int, bots: int, pending: int, processed: int, rss_kb: int, cpu_seconds: float):
+    """Record a worker process's health and load. 💓"""
+    conn = get_connection()
+    with _lock, conn:
+        conn.execute(SQL_WORKER_HEARTBEAT, (worker_id, pid, bots, pending, processed, rss_kb, cpu_seconds, time.time()))
+
+def record_worker_restart(worker_id: int):
+    """Count a restart of a crashed or hung worker. 🔄"""
+    conn = get_connection()
+    with _lock, conn:
+        conn.execute(SQL_WORKER_RESTART, (worker_id,))
+
+def get_worker_heartbeat(worker_id: int) -> Optional[float]:
+    """Return when a worker last reported in, if it ever has. ⏱️"""
+    with _lock:
+        row = get_connection().execute(SQL_WORKER_HEARTBEAT_AT, (worker_id,)).fetchone()
+    return row[0] if row else None
+
+def get_worker_health(count: int) -> List[Dict]:
+    """Load the latest health reports of the first `count` workers. 📋"""
+    keys = ("worker_id", "pid", "bots", "pending", "processed", "rss_kb", "cpu_seconds", "restarts", "heartbeat_at")
+    with _lock:
+        rows = get_connection().execute(SQL_GET_WORKERS, (count,)).fetchall()
+    return [dict(zip(keys, row)) for row in rows]
+
+def clear_worker_health():
+    """Forget reports from a previous supervisor run. 🧹"""
+    conn = get_connection()
+    with _lock, conn:
+        conn.execute(SQL_CLEAR_WORKERS)
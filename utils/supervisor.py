@@ -0,0 +1,176 @@
+import os
+import time
+import signal
+import logging
+import resource
+import multiprocessing
+from typing import Callable, Dict, List, Optional
+from telegram.ext import Application
+from utils.storage import (
+    close_storage, save_worker_heartbeat, record_worker_restart,
+    get_worker_heartbeat, get_worker_health, clear_worker_health
+)
+from utils.persistence import PeriodicJob
+from utils.sharding import shard
+from utils.tenants import tenants
+
+logger = logging.getLogger(__name__)
+
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "1"))  # Processes sharing the hosted bots, 1 keeps everything in one process
+WORKER_HEARTBEAT_INTERVAL = 10  # Seconds between worker health reports
+WORKER_STALE_AFTER = 120  # Seconds without a report before a worker is treated as hung
+SUPERVISOR_CHECK_INTERVAL = 5  # Seconds between worker liveness checks
+SUPERVISOR_REPORT_INTERVAL = 300  # Seconds between health summaries in the log
+RESTART_BACKOFF_MAX = 60  # Longest wait before restarting a worker that keeps crashing
+
+class WorkerHeartbeat(PeriodicJob):
+    """
+    Reports this worker's health and load to the shared database. 💓
+    Bots hosted, queued and processed updates, peak memory and CPU time are
+    written every WORKER_HEARTBEAT_INTERVAL seconds; the supervisor treats a
+    worker that stops reporting as hung.
+    """
+
+    def __init__(self):
+        super().__init__("Worker heartbeat", self.beat, WORKER_HEARTBEAT_INTERVAL)
+        self.primary: Optional[Application] = None
+
+    def start(self, primary: Optional[Application] = None):
+        """Start reporting, counting the primary bot if this worker runs it. 🚀"""
+        self.primary = primary
+        super().start()
+
+    def beat(self):
+        applications: List[Application] = list(tenants.applications.values())
+        if self.primary:
+            applications.append(self.primary)
+        processors = [application.update_processor for application in applications]
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        save_worker_heartbeat(
+            shard.index, os.getpid(), len(applications),
+            sum(getattr(processor, "pending", 0) for processor in processors),
+            sum(getattr(processor, "processed", 0) for processor in processors),
+            usage.ru_maxrss, usage.ru_utime + usage.ru_stime
+        )
+
+worker_heartbeat = WorkerHeartbeat()
+
+def format_worker_health(count: int = BOT_WORKERS) -> List[str]:
+    """Render one line per worker for the log and /stats. 🩺"""
+    lines = []
+    now = time.time()
+    for worker in get_worker_health(count):
+        if worker["heartbeat_at"] is None:
+            lines.append(f"#{worker['worker_id']}: starting, {worker['restarts']} restarts")
+            continue
+        age = now - worker["heartbeat_at"]
+        state = "ok" if age <= WORKER_STALE_AFTER else "stale"
+        lines.append(
+            f"#{worker['worker_id']} pid {worker['pid']}: {state} ({age:.0f}s ago), "
+            f"{worker['bots']} bots, {worker['pending']} pending, {worker['processed']} processed, "
+            f"peak RSS {worker['rss_kb'] // 1024} MB, CPU {worker['cpu_seconds']:.0f}s, {worker['restarts']} restarts"
+        )
+    return lines
+
+class Supervisor:
+    """
+    Spreads the hosted bots over BOT_WORKERS processes and keeps them running. 🧑‍✈️
+    Each worker owns the clones that rendezvous hashing assigns to it, so a
+    clone always lands in the same worker and resizing the pool only moves
+    the clones of added or removed workers. Worker 0 also runs the primary
+    bot. Workers that exit are restarted with exponential backoff, and a
+    worker that stops sending heartbeats is killed and restarted too.
+    """
+
+    def __init__(self, count: int, target: Callable[[int, int], None]):
+        self.count = count
+        self.target = target
+        self.processes: Dict[int, Optional[multiprocessing.Process]] = {}
+        self.started_at: Dict[int, float] = {}
+        self.failures: Dict[int, int] = {}
+        self.next_start: Dict[int, float] = {}
+        self._context = multiprocessing.get_context("spawn")
+        self._stopping = False
+        self._last_report = time.monotonic()
+
+    def run(self):
+        """Start all workers and supervise them until SIGTERM or SIGINT. 🚀"""
+        clear_worker_health()
+        # Workers open their own database connections
+        close_storage()
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+
+        for index in range(self.count):
+            self._start(index)
+        logger.info(f"✅ Supervisor started {self.count} bot workers")
+
+        while not self._stopping:
+            time.sleep(SUPERVISOR_CHECK_INTERVAL)
+            try:
+                self._check()
+            except Exception as e:
+                logger.error(f"🚨 Supervisor check failed: {str(e)}")
+        self._stop_all()
+
+    def _request_stop(self, signum, frame):
+        self._stopping = True
+
+    def _start(self, index: int):
+        process = self._context.Process(target=self.target, args=(index, self.count), name=f"bot-worker-{index}")
+        process.start()
+        self.processes[index] = process
+        self.started_at[index] = time.time()
+        logger.info(f"ℹ️ Started bot worker {index} (pid {process.pid})")
+
+    def _check(self):
+        now = time.time()
+        for index in range(self.count):
+            process = self.processes.get(index)
+            if process is None:
+                if now >= self.next_start[index]:
+                    self._start(index)
+                continue
+
+            if not process.is_alive():
+                logger.error(f"🚨 Bot worker {index} (pid {process.pid}) exited with code {process.exitcode}")
+                self._schedule_restart(index, now)
+                continue
+
+            last_seen = max(get_worker_heartbeat(index) or 0, self.started_at[index])
+            if now - last_seen > WORKER_STALE_AFTER:
+                logger.error(f"🚨 Bot worker {index} (pid {process.pid}) sent no heartbeat for {now - last_seen:.0f}s, killing it")
+                process.kill()
+                process.join(timeout=5)
+                self._schedule_restart(index, now)
+
+        if time.monotonic() - self._last_report >= SUPERVISOR_REPORT_INTERVAL:
+            self._last_report = time.monotonic()
+            for line in format_worker_health(self.count):
+                logger.info(f"ℹ️ Worker {line}")
+
+    def _schedule_restart(self, index: int, now: float):
+        self.processes[index] = None
+        record_worker_restart(index)
+        # A worker that ran for a while before dying starts over with a short delay
+        if now - self.started_at[index] > RESTART_BACKOFF_MAX:
+            self.failures[index] = 0
+        self.failures[index] = self.failures.get(index, 0) + 1
+        delay = min(RESTART_BACKOFF_MAX, 2 ** (self.failures[index] - 1))
+        self.next_start[index] = now + delay
+        logger.info(f"ℹ️ Restarting bot worker {index} in {delay}s")
+
+    def _stop_all(self):
+        """Ask every worker to shut down cleanly, killing those that do not. 🛑"""
+        running = [process for process in self.processes.values() if process and process.is_alive()]
+        for process in running:
+            process.terminate()
+        deadline = time.time() + 30
+        for process in running:
+            process.join(timeout=max(0, deadline - time.time()))
+            if process.is_alive():
+                logger.error(f"🚨 Bot worker pid {process.pid} did not stop in time, killing it")
+                process.kill()
+                process.join()
+        close_storage()
+        logger.info("ℹ️ Supervisor stopped")
@@ -0,0 +1,169 @@
+import os
+import re
+import asyncio
+import logging
+from typing import Callable, Dict, Optional
+from telegram import Bot, Update
+from telegram.ext import Application
+from utils.storage import get_cloned_bots
+from utils.executor import run_blocking
+from utils.sharding import shard
+from utils.broadcast import broadcaster
+
+logger = logging.getLogger(__name__)
+
+TENANT_SYNC_INTERVAL = int(os.getenv("TENANT_SYNC_INTERVAL", "30"))  # Seconds between scans for clones registered elsewhere
+BOT_TOKEN_PATTERN = re.compile(r"^\d+:[A-Za-z0-9_-]+$")
+
+def is_bot_token(token: str) -> bool:
+    """Check that a token has the <bot ID>:<secret> shape Telegram issues. 🔍"""
+    return bool(BOT_TOKEN_PATTERN.match(token))
+
+def clone_bot_id(token: str) -> int:
+    """Return the Telegram bot ID a clone's users and broadcasts are stored under. 🆔"""
+    return int(token.split(":")[0])
+
+class TenantManager:
+    """
+    Runs every cloned bot as its own Application in the main event loop. 🤖
+    Tenants are plain PTB applications with the same handlers as the main
+    bot; the file catalog, search index, caches, storage and outbound HTTP
+    client are module-level singletons, so they are shared rather than
+    duplicated per clone. Users and broadcasts are kept per clone, and each
+    running clone sends its own broadcasts.
+
+    When clones are sharded across worker processes, each manager only runs
+    the clones its shard owns, and rescans the registry every
+    TENANT_SYNC_INTERVAL seconds to pick up clones added through another
+    process.
+    """
+
+    def __init__(self):
+        self.applications: Dict[str, Application] = {}
+        self._build: Optional[Callable[[str, Optional[str]], Application]] = None
+        self._exclude = set()
+        self._starting = None
+        self._adding: Dict[str, asyncio.Future] = {}
+        self._syncing = None
+        self._stopping = None
+
+    @property
+    def active(self) -> bool:
+        return self._build is not None
+
+    def owns(self, token: str) -> bool:
+        """Check whether a clone belongs to this process's shard. 🧩"""
+        # Malformed tokens, e.g. from the unvalidated legacy registry, can never start
+        return token not in self._exclude and is_bot_token(token) and shard.owns(token)
+
+    def start(self, build: Callable[[str, Optional[str]], Application], exclude_token: Optional[str] = None):
+        """Start all registered clones in the background. 🚀"""
+        self._build = build
+        if exclude_token:
+            self._exclude.add(exclude_token)
+        self._stopping = asyncio.Event()
+        self._starting = asyncio.create_task(self._start_all())
+        self._syncing = asyncio.create_task(self._sync_loop())
+
+    async def _start_all(self):
+        bots = [bot for bot in get_cloned_bots() if self.owns(bot["token"])]
+        results = await asyncio.gather(*(self.add(bot["token"], bot["owner_id"]) for bot in bots))
+        logger.info(f"ℹ️ Started {sum(results)} of {len(bots)} cloned bots in shard {shard.index + 1}/{shard.count}")
+
+    async def _sync_loop(self):
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=TENANT_SYNC_INTERVAL)
+            except asyncio.TimeoutError:
+                await self.sync()
+
+    async def sync(self):
+        """Start owned clones that were registered after startup. 🔄"""
+        if self._starting and not self._starting.done():
+            return
+        try:
+            bots = await run_blocking(get_cloned_bots)
+            missing = [bot for bot in bots if self.owns(bot["token"]) and bot["token"] not in self.applications]
+            if missing:
+                results = await asyncio.gather(*(self.add(bot["token"], bot["owner_id"]) for bot in missing))
+                logger.info(f"ℹ️ Started {sum(results)} of {len(missing)} newly registered cloned bots")
+        except Exception as e:
+            logger.error(f"🚨 Failed to sync cloned bots: {str(e)}")
+
+    async def add(self, token: str, owner_id: Optional[str] = None) -> bool:
+        """
+        Start a cloned bot, e.g. right after /clone. Returns True if it is running. ➕
+        A clone owned by another shard is only checked against Telegram here;
+        its own worker starts it on the next sync.
+        """
+        if not self.active or token in self._exclude or not is_bot_token(token):
+            return False
+        if token in self.applications:
+            return True
+        if not shard.owns(token):
+            return await self._check_token(token)
+        # A sync and a /clone can race to start the same clone; both wait on one start
+        if token not in self._adding:
+            self._adding[token] = asyncio.ensure_future(self._add(token, owner_id))
+        return await asyncio.shield(self._adding[token])
+
+    @staticmethod
+    async def _check_token(token: str) -> bool:
+        try:
+            async with Bot(token):
+                return True
+        except Exception as e:
+            logger.error(f"🚨 Cloned bot token {token.split(':')[0]} was rejected: {str(e)}")
+            return False
+
+    async def _add(self, token: str, owner_id: Optional[str]) -> bool:
+        application = None
+        try:
+            application = self._build(token, owner_id)
+            await application.initialize()
+            await application.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+            await application.start()
+        except Exception as e:
+            logger.error(f"🚨 Failed to start cloned bot {token.split(':')[0]}: {str(e)}")
+            try:
+                if application is not None:
+                    await application.shutdown()
+            except Exception:
+                pass
+            return False
+        finally:
+            self._adding.pop(token, None)
+
+        self.applications[token] = application
+        broadcaster.attach(clone_bot_id(token), application.bot)
+        logger.info(f"✅ Cloned bot @{application.bot.username} started")
+        return True
+
+    async def remove(self, token: str):
+        """Stop a running cloned bot. ➖"""
+        application = self.applications.pop(token, None)
+        if not application:
+            return
+        await broadcaster.detach(clone_bot_id(token))
+        try:
+            if application.updater.running:
+                await application.updater.stop()
+            if application.running:
+                await application.stop()
+            await application.shutdown()
+        except Exception as e:
+            logger.error(f"🚨 Failed to stop cloned bot {token.split(':')[0]}: {str(e)}")
+
+    async def stop(self):
+        """Stop every cloned bot. 🛑"""
+        if self._syncing:
+            self._stopping.set()
+            await asyncio.gather(self._syncing, return_exceptions=True)
+            self._syncing = None
+        if self._starting:
+            await asyncio.gather(self._starting, return_exceptions=True)
+            self._starting = None
+        await asyncio.gather(*(self.remove(token) for token in list(self.applications)))
+        self._build = None
+
+tenants = TenantManager()
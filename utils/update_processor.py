@@ -0,0 +1,207 @@
+import os
+import time
+import asyncio
+import logging
+import warnings
+from collections import deque
+from typing import Awaitable, Dict, Hashable
+from telegram import Update
+from telegram.constants import ChatType
+from telegram.ext import BaseUpdateProcessor
+from telegram.warnings import PTBUserWarning
+
+logger = logging.getLogger(__name__)
+
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", "16"))  # Handlers running at once
+MAX_PENDING_UPDATES = int(os.getenv("MAX_PENDING_UPDATES", "512"))  # Queued updates before intake waits
+MAX_CHAT_BACKLOG = int(os.getenv("MAX_CHAT_BACKLOG", "32"))  # Queued updates per chat before its new ones are dropped
+SHED_RATIO = 0.75  # Share of MAX_PENDING_UPDATES at which group chatter is dropped
+WAIT_SAMPLES = 1000  # Recent wait times kept for percentiles
+
+# The backlog is still handed out after Application.stop() begins; those
+# updates are awaited through the queue's join(), not the task registry
+warnings.filterwarnings("ignore", message="Tasks created via `Application.create_task` while the application is not running", category=PTBUserWarning)
+
+def _sheddable(update: Update) -> bool:
+    """Plain text in groups is the only traffic that is safe to drop under load. 💬"""
+    if not update.message or not update.message.text:
+        return False
+    if update.message.chat.type not in (ChatType.GROUP, ChatType.SUPERGROUP):
+        return False
+    return not update.message.text.startswith("/")
+
+def _lane(update: Update) -> Hashable:
+    """Updates of one chat share a lane; updates without a chat each get their own. 🛣️"""
+    if update.effective_chat:
+        return update.effective_chat.id
+    return (None, update.update_id)
+
+class ChatOrderedQueue:
+    """
+    Update queue that hands updates to the application one chat at a time. 🚦
+    Drop-in for the application's asyncio.Queue: the updater (or webhook)
+    puts updates in, and the application's fetcher takes them out. Each
+    chat has its own lane, and lanes with work take turns. An update is only
+    handed out when a handler slot is free and no earlier update of its chat
+    is still running, so a busy chat waits in its own lane instead of
+    holding slots that other chats could use.
+
+    Intake is bounded: put() waits while `max_pending` updates are queued,
+    which holds back polling (or the webhook response) until handlers catch
+    up. Once the backlog passes SHED_RATIO of that, plain group messages
+    (search chatter) are dropped, and a chat with `max_chat_backlog` updates
+    queued has its new ones dropped; commands, private messages and button
+    clicks are otherwise always kept. Waits are measured from arrival to
+    the moment a handler starts.
+    """
+
+    def __init__(self, concurrency: int = UPDATE_CONCURRENCY, max_pending: int = MAX_PENDING_UPDATES,
+                 max_chat_backlog: int = MAX_CHAT_BACKLOG):
+        self.concurrency = concurrency
+        self.max_pending = max_pending
+        self.max_chat_backlog = max_chat_backlog
+        self.shed_threshold = int(max_pending * SHED_RATIO)
+        self.queued = 0
+        self.running = 0
+        self.peak_queued = 0
+        self.shed = 0
+        self.waits = deque(maxlen=WAIT_SAMPLES)
+        self._lanes: Dict[Hashable, deque] = {}
+        self._busy = set()
+        self._ready = deque()
+        self._signals = deque()
+        self._unfinished = 0
+        self._dispatchable = asyncio.Event()
+        self._space = asyncio.Event()
+        self._finished = asyncio.Event()
+        self._finished.set()
+
+    def qsize(self) -> int:
+        return self.queued + len(self._signals)
+
+    def empty(self) -> bool:
+        return not self.qsize()
+
+    def full(self) -> bool:
+        return self.queued >= self.max_pending
+
+    async def put(self, update: object):
+        """Queue an update, waiting while the backlog is full. 📥"""
+        while isinstance(update, Update) and self.full():
+            self._space.clear()
+            await self._space.wait()
+        self.put_nowait(update)
+
+    def put_nowait(self, update: object):
+        if not isinstance(update, Update):
+            # The application's stop signal, handed out once the backlog is drained
+            self._signals.append(update)
+            self._track()
+            return
+        if self.full():
+            raise asyncio.QueueFull
+        lane_id = _lane(update)
+        lane = self._lanes.get(lane_id)
+        if (self.queued >= self.shed_threshold and _sheddable(update)) or (lane and len(lane) >= self.max_chat_backlog):
+            self.shed += 1
+            if self.shed % 100 == 1:
+                logger.info(f"ℹ️ Update backlog at {self.queued}, dropping updates ({self.shed} so far)")
+            return
+
+        if lane is None:
+            lane = self._lanes[lane_id] = deque()
+        lane.append((time.monotonic(), update))
+        if len(lane) == 1 and lane_id not in self._busy:
+            self._ready.append(lane_id)
+        self.queued += 1
+        self.peak_queued = max(self.peak_queued, self.queued)
+        self._track()
+
+    def _track(self):
+        self._unfinished += 1
+        self._finished.clear()
+        self._dispatchable.set()
+
+    async def get(self) -> object:
+        """Hand out the next update whose chat is idle, once a handler slot is free. 📤"""
+        while True:
+            if self._ready and self.running < self.concurrency:
+                lane_id = self._ready.popleft()
+                arrived, update = self._lanes[lane_id].popleft()
+                self._busy.add(lane_id)
+                self.queued -= 1
+                self.running += 1
+                self.waits.append(time.monotonic() - arrived)
+                self._space.set()
+                return update
+            if self._signals and not self.queued:
+                return self._signals.popleft()
+            self._dispatchable.clear()
+            await self._dispatchable.wait()
+
+    def release(self, update: Update):
+        """Free the slot of a finished update and give its chat's next update a turn. ✅"""
+        lane_id = _lane(update)
+        self._busy.discard(lane_id)
+        self.running -= 1
+        if self._lanes.get(lane_id):
+            self._ready.append(lane_id)
+        else:
+            self._lanes.pop(lane_id, None)
+        self._dispatchable.set()
+
+    def task_done(self):
+        self._unfinished -= 1
+        if self._unfinished <= 0:
+            self._unfinished = 0
+            self._finished.set()
+
+    async def join(self):
+        await self._finished.wait()
+
+class ChatOrderedProcessor(BaseUpdateProcessor):
+    """
+    Concurrent update processor that keeps each chat's updates in order. 🚦
+    Scheduling happens in its ChatOrderedQueue, which must be the
+    application's update queue; the processor only runs the handlers and
+    reports back to the queue when each one finishes.
+    """
+
+    def __init__(self, concurrency: int = UPDATE_CONCURRENCY, max_pending: int = MAX_PENDING_UPDATES):
+        super().__init__(concurrency)
+        self.queue = ChatOrderedQueue(concurrency, max_pending)
+        self.processed = 0
+
+    @property
+    def pending(self) -> int:
+        """Updates queued or running. ⏳"""
+        return self.queue.queued + self.queue.running
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_process_update(self, update: object, coroutine: Awaitable):
+        try:
+            await coroutine
+        finally:
+            self.processed += 1
+            if isinstance(update, Update):
+                self.queue.release(update)
+
+    def stats(self) -> str:
+        """Return queue depth and wait time figures for /stats. 📊"""
+        queue = self.queue
+        waits = sorted(queue.waits)
+        if waits:
+            average = sum(waits) / len(waits) * 1000
+            p95 = waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000
+        else:
+            average = p95 = 0.0
+        return (
+            f"{queue.queued} queued (peak {queue.peak_queued}), {queue.running} running, "
+            f"wait avg {average:.0f} ms / p95 {p95:.0f} ms, "
+            f"{self.processed} processed, {queue.shed} shed"
+        )
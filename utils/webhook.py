@@ -0,0 +1,172 @@
+import os
+import hmac
+import json
+import asyncio
+import logging
+import threading
+import concurrent.futures
+from typing import Callable, Optional
+from telegram import Bot, Update
+from telegram.ext import Application
+from werkzeug.wrappers import Request, Response
+from gunicorn.app.base import BaseApplication
+from utils.storage import close_storage, acquire_worker_slot, clear_worker_health
+from utils.sharding import shard
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+SUBMIT_TIMEOUT = 10  # Seconds a webhook request waits for room in a full update queue
+DEFAULT_WEBHOOK_PATH = "/telegram"
+
+class BotRunner:
+    """
+    Runs a PTB Application on its own event loop thread inside a WSGI worker. 🔁
+    Webhook requests are decoded on the server threads and handed to the
+    application's update queue, so the HTTP response never waits for a handler.
+    When the queue is full the request waits for room, and gives up after
+    SUBMIT_TIMEOUT seconds so Telegram retries the update later.
+    """
+
+    def __init__(self, application: Application):
+        self.application = application
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="bot-loop", daemon=True)
+
+    def _call(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def start(self):
+        """Initialize and start the application the way run_polling would. 🚀"""
+        self._thread.start()
+        self._call(self._start())
+
+    async def _start(self):
+        application = self.application
+        await application.initialize()
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+
+    def stop(self):
+        """Stop the application and its event loop. 🛑"""
+        self._call(self._stop())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+
+    async def _stop(self):
+        application = self.application
+        await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+    def submit(self, data: dict) -> bool:
+        """Queue one update received from Telegram. Returns False if the queue stayed full. 📥"""
+        update = Update.de_json(data, self.application.bot)
+        future = asyncio.run_coroutine_threadsafe(self.application.update_queue.put(update), self.loop)
+        try:
+            future.result(timeout=SUBMIT_TIMEOUT)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            return False
+        return True
+
+def make_wsgi_app(runner: BotRunner, path: str, secret: str):
+    """Build the WSGI endpoint that validates and forwards webhook updates. 🌐"""
+
+    @Request.application
+    def webhook_app(request: Request) -> Response:
+        if request.path != path or request.method != "POST":
+            return Response("Not found", status=404)
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), secret):
+            logger.error(f"🚨 Rejected webhook request with a bad secret token from {request.remote_addr}")
+            return Response("Forbidden", status=403)
+        try:
+            data = json.loads(request.get_data())
+        except ValueError:
+            return Response("Bad request", status=400)
+        if not runner.submit(data):
+            # Telegram redelivers updates that were not acknowledged
+            logger.error("🚨 Update queue full, asking Telegram to retry")
+            return Response("Busy", status=503)
+        return Response("OK")
+
+    return webhook_app
+
+class WebhookServer(BaseApplication):
+    """
+    Gunicorn server running one bot application per worker process. 🦄
+    Each worker builds its application after the fork, so workers share
+    nothing but the SQLite database. Webhook updates only reach the primary
+    bot, so the cloned bots, which poll, are sharded over the workers: each
+    worker claims a slot and hosts the clones rendezvous hashing assigns to it.
+    """
+
+    def __init__(self, build_application: Callable[[], Application], path: str, secret: str, options: dict):
+        self.build_application = build_application
+        self.path = path
+        self.secret = secret
+        self.options = options
+        self.runner: Optional[BotRunner] = None
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+        self.cfg.set("worker_exit", self._worker_exit)
+
+    def load(self):
+        workers = self.options["workers"]
+        if workers > 1:
+            slot = acquire_worker_slot(workers)
+            if slot is None:
+                logger.error(f"🚨 Webhook worker {os.getpid()} found no free worker slot, it will host no cloned bots")
+            shard.configure(slot, workers)
+        self.runner = BotRunner(self.build_application())
+        self.runner.start()
+        logger.info(f"✅ Webhook worker {os.getpid()} started")
+        return make_wsgi_app(self.runner, self.path, self.secret)
+
+    def _worker_exit(self, server, worker):
+        if self.runner:
+            self.runner.stop()
+
+async def set_webhook(token: str, url: str, secret: str):
+    """Point Telegram at the webhook endpoint. 🔗"""
+    async with Bot(token) as bot:
+        await bot.set_webhook(url=url, secret_token=secret, allowed_updates=Update.ALL_TYPES)
+
+def run_webhook(token: str, build_application: Callable[[], Application]):
+    """
+    Serve updates over a webhook instead of long polling. 🌐
+    Configured by WEBHOOK_URL (public base URL), WEBHOOK_SECRET, WEBHOOK_PATH,
+    PORT, WEB_WORKERS and WEB_THREADS.
+    """
+    webhook_url = os.getenv("WEBHOOK_URL")
+    secret = os.getenv("WEBHOOK_SECRET")
+    if not webhook_url or not secret:
+        logger.error("🚨 WEBHOOK_URL and WEBHOOK_SECRET must be set in webhook mode")
+        return
+
+    path = os.getenv("WEBHOOK_PATH", DEFAULT_WEBHOOK_PATH)
+    port = int(os.getenv("PORT", "8443"))
+    workers = int(os.getenv("WEB_WORKERS", "1"))
+    threads = int(os.getenv("WEB_THREADS", "4"))
+
+    asyncio.run(set_webhook(token, f"{webhook_url.rstrip('/')}{path}", secret))
+    # Worker health is reported per slot; forget reports from a previous run
+    clear_worker_health()
+    # Workers open their own database connections after the fork
+    close_storage()
+
+    logger.info(f"✅ Serving webhook on port {port} at {path} with {workers} workers")
+    WebhookServer(build_application, path, secret, {
+        "bind": f"0.0.0.0:{port}",
+        "workers": workers,
+        "threads": threads,
+        "worker_class": "gthread",
+        "timeout": 60
+    }).run()